@@ -1,16 +1,21 @@
 import streamlit as st
 import json
 import os
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
+import time
 from PIL import Image
 
-from modules import LLMBackend, RAGResearchProcessorLLM, LLMUCREvaluator, CIREstimator
+from modules import (LLMBackend, RAGResearchProcessorLLM, LLMUCREvaluator, CIREstimator, ArtifactStore,
+                     PIPELINE_STAGES, PROMPT_MMR, compile_prompt, preload, question_cache, run_analysis)
+import jobs
+import telemetry
 
 
 st.set_page_config(page_title="📘 Research Paper Analyzer", layout="wide", initial_sidebar_state="collapsed")
 
+# Prometheus metrics for every session in this process, e.g. PAPER_METRICS_PORT=9464
+if os.getenv("PAPER_METRICS_PORT"):
+    telemetry.start_http_server(int(os.getenv("PAPER_METRICS_PORT")))
+
 # --- Custom CSS for futuristic theme ---
 st.markdown("""
     <style>
@@ -308,35 +313,117 @@ else:
 
 url = st.text_input("📎 Enter PDF URL (e.g. arXiv):")
 
+# Load the embedding model in the background while the user fills in the form (once per process)
+preload()
+
+CHAT_PROMPT = """You are a research assistant. Use the following context from the paper to answer the question.
+
+Context:
+{context}
+Question: {question}
+Answer: """
+
+JOB_TIMEOUT = float(os.getenv("PAPER_JOB_TIMEOUT", 1800))  # seconds a page waits for one analysis
+
+CLAIMS = """The Transformer architecture introduced self-attention for sequence modeling.
+        It eliminated recurrence and convolution, achieving state-of-the-art results in translation tasks."""
+
+# Analyses run in background worker processes; the job id survives a page refresh via the URL
+job_id = st.session_state.get("job_id") or st.query_params.get("job")
+if api_key and (job_id or url):
+    # (re)started on every path that waits for a job, including a ?job= refresh after a server restart
+    pool = jobs.ensure_workers()
 if api_key and url and st.button("🚀 Run Analysis"):
+    # submitting a URL that is already being analyzed joins that job; the key stays in this process's memory
+    job_id = st.session_state["job_id"] = pool.submit(jobs.JobQueue(), url, {"claims": CLAIMS}, api_key=api_key)
+    st.query_params["job"] = job_id
+
+job = st.session_state.get("job")
+if job and job["id"] != job_id:
+    job = None
+if api_key and job_id and job is None:
+    progress = st.progress(0.0, text="🔍 Queued, waiting for a worker...")
+
+    def show_progress(j):
+        finished = [s for s in PIPELINE_STAGES if j["progress"].get(s) in ("done", "cached")]
+        progress.progress(len(finished) / len(PIPELINE_STAGES),
+                          text=f"🔍 Processing paper... ({j['stage'] or 'queued'})" if j["status"] != "done"
+                          else "✅ Done")
+
+    job = jobs.wait(jobs.JobQueue(), job_id, on_update=show_progress, timeout=JOB_TIMEOUT, worker_grace=60)
+    progress.empty()
+    if job and job["status"] in ("queued", "running"):
+        # keep ?job= so a refresh resumes waiting once workers are back
+        st.warning(f"⏳ The analysis is still {job['status']}: " +
+                   ("no job worker is running (start them with `python jobs.py`)." if not jobs.JobQueue().live_workers()
+                    else "it is taking longer than expected. Refresh the page to keep waiting."))
+        job = None
+    elif job is None or job["status"] != "done":
+        st.error("❌ Analysis failed: " + ((job or {}).get("error") or {}).get("message", "unknown job"))
+        st.session_state.pop("job_id", None)
+        st.query_params.pop("job", None)
+        job = None
+
+if job and st.session_state.get("job", {}).get("id") != job["id"]:
+    # The worker stored every stage in the shared result store: load them once per job, not on every rerun
     llm = LLMBackend(api_key=api_key)
     proc = RAGResearchProcessorLLM(llm)
-    cir = CIREstimator(llm)
-    eval = LLMUCREvaluator(llm)
-
-    with st.spinner("🔍 Processing paper..."):
-        text, pages = proc.extract_document_text(url)
-        analysis = proc.analyze_research_paper(text)
-        chunks = proc.create_rag_chunks(pages)
-        cir_res = cir.compute_cir(analysis.get("title", ""), analysis.get("abstract", ""))
-        claims = """The Transformer architecture introduced self-attention for sequence modeling.
-        It eliminated recurrence and convolution, achieving state-of-the-art results in translation tasks."""
-        ucr = eval.analyze_claim_support(claims, chunks)
-
-    st.success("✅ Analysis Complete!")
+    result = job["result"]
+    chunks = ArtifactStore().get(result["sha256"], "chunks", result["keys"]["chunks"])
+    if chunks is None:  # evicted from the store since the job ran
+        chunks = run_analysis(job["url"], proc, CIREstimator(llm), LLMUCREvaluator(llm, retriever=proc),
+                              ArtifactStore(), job["options"].get("claims", CLAIMS))["chunks"]
+    st.session_state.update(job=job, rag_chunks=chunks, proc=proc, llm=llm,
+                            paper_id=f"{result['sha256']}:{result['keys']['chunks']}")  # cached answers follow the chunks
+
+if job:
+    # Charting libraries are only imported once there is something to plot
+    import plotly.graph_objects as go
+
+    result = job["result"]
+    analysis, cir_res, ucr = result["analysis"], result["cir"], result["ucr"]
+
+    reused = len(job["result"]["cached"])
+    st.success("✅ Analysis Complete!" + (f" ({reused} of 4 stages loaded from the shared result store)"
+                                         if reused else ""))
+
+    # ---- Timing Waterfall ----
+    spans = job["result"]["trace"]["spans"]  # recorded by the worker that ran the job
+    total = max((s["start_s"] + s["duration_s"] for s in spans), default=0)
+    with st.expander(f"⏱️ Timing waterfall ({total:.1f}s)"):
+        labels = [("▸ " if s["kind"] == "stage" else "    ") + s["name"] for s in spans]
+        fig_t = go.Figure(go.Bar(
+            y=[f"{l} #{i}" for i, l in enumerate(labels)],
+            x=[s["duration_s"] for s in spans],
+            base=[s["start_s"] for s in spans],
+            orientation="h",
+            marker_color=["#6366f1" if s["kind"] == "stage" else "#22c55e" for s in spans],
+            hovertext=[f"{s['name']}: {s['duration_s']:.3f}s" for s in spans],
+            hoverinfo="text"
+        ))
+        fig_t.update_layout(
+            xaxis_title="Seconds",
+            yaxis=dict(autorange="reversed", showticklabels=True),
+            height=max(250, 22 * len(spans)),
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15, 23, 42, 0.5)',
+            font=dict(color='#c7d2fe')
+        )
+        st.plotly_chart(fig_t, use_container_width=True)
 
     # ---- Summary Cards ----
     st.subheader("Key Metrics")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Citations", cir_res["citations"])
-    col2.metric("Novelty", f"{cir_res['novelty']*100:.0f}%")
-    col3.metric("CIR Score", f"{cir_res['CIR']*100:.0f}%")
+    col1.metric("Citations", cir_res["citations"] if cir_res["citations"] is not None else "n/a")
+    col2.metric("Novelty", f"{cir_res['novelty']*100:.0f}%" if cir_res.get("novelty") is not None else "n/a")
+    col3.metric("CIR Score", f"{cir_res['CIR']*100:.0f}%" if cir_res["CIR"] is not None else "n/a",
+                help="Needs a citation count and a novelty score" if cir_res["CIR"] is None else None)
 
     # ---- Radar Chart (CIR components) ----
     st.subheader("📈 CIR Component Radar Chart")
     fig = go.Figure()
     fig.add_trace(go.Scatterpolar(
-        r=[cir_res["novelty"], cir_res["CIR"], cir_res["citations"]/100],
+        r=[cir_res.get("novelty") or 0, cir_res["CIR"] or 0, (cir_res["citations"] or 0)/100],
         theta=["Novelty", "CIR", "Citations"],
         fill='toself',
         name="CIR Profile",
@@ -373,10 +460,18 @@ if api_key and url and st.button("🚀 Run Analysis"):
         font=dict(color='#c7d2fe')
     )
     st.plotly_chart(fig2, use_container_width=True)
+    if ucr.get("unverified"):
+        st.warning(f"{ucr['unverified']} of {ucr['total']} claims got no verdict from the LLM and are not counted; "
+                   "this result is not cached.")
+    if ucr.get("local_decisions"):
+        st.caption(f"{ucr['local_decisions']} of {ucr['total']} claims decided by the local NLI model; "
+                   f"{ucr['llm_calls']} LLM calls, {ucr['llm_calls_avoided']} avoided.")
 
     # ---- Word Cloud of Key Concepts ----
     if analysis.get("key_concepts"):
         st.subheader("🌐 Key Concept Cloud")
+        import matplotlib.pyplot as plt
+        from wordcloud import WordCloud
         text_for_wc = " ".join(analysis["key_concepts"])
         wc = WordCloud(
             width=800, 
@@ -395,10 +490,6 @@ if api_key and url and st.button("🚀 Run Analysis"):
     st.subheader("📄 Paper Analysis Summary")
     st.json(analysis)
 
-    # Store chunks and processor in session state for chatbot
-    st.session_state["rag_chunks"] = chunks
-    st.session_state["proc"] = proc
-    st.session_state["llm"] = llm
 
 # ---- Chatbot: Ask the Paper ----
 # Only show chatbot if analysis has been run
@@ -411,31 +502,58 @@ if "rag_chunks" in st.session_state and st.session_state["rag_chunks"]:
 
     user_query = st.text_input("Ask a question about the paper:")
 
-    if user_query:
-        with st.spinner("Thinking..."):
-            # Retrieve relevant chunks for context
-            retrieved = st.session_state["proc"].retrieve_relevant_chunks(
-                user_query, 
-                st.session_state["rag_chunks"], 
-                top_k=3
-            )
-
-            # Build a chat prompt using the retrieved context
-            context = "\n\n".join([r["text"] for r in retrieved])
-            prompt = f"""You are a research assistant. Use the following context from the paper to answer the question.
-
-Context:
-{context}
-Question: {user_query}
-Answer: """
-
-            answer = st.session_state["llm"].chat(prompt)
-
-            # Update chat history
-            st.session_state["chat_history"].append({"user": user_query, "assistant": answer})
-
     # Display chat history
     for chat in st.session_state["chat_history"]:
         st.markdown(f"<div class='chat-bubble-user'>🧑 <b>You:</b> {chat['user']}</div>", unsafe_allow_html=True)
         st.markdown(f"<div class='chat-bubble-ai'>🤖 <b>AI:</b> {chat['assistant']}</div>", unsafe_allow_html=True)
-        st.markdown("---")
\ No newline at end of file
+        st.markdown("---")
+
+    if user_query:
+        proc, qcache = st.session_state["proc"], question_cache()
+        t0 = time.perf_counter()
+        q_vec = proc.embed_query(user_query)
+        # Near-identical questions about this paper (from any user) reuse the earlier answer
+        cached = qcache.lookup(st.session_state["paper_id"], q_vec)
+
+        st.markdown(f"<div class='chat-bubble-user'>🧑 <b>You:</b> {user_query}</div>", unsafe_allow_html=True)
+        if cached:
+            answer = cached["answer"]
+            st.markdown(f"<div class='chat-bubble-ai'>🤖 <b>AI:</b> {answer}</div>", unsafe_allow_html=True)
+            st.caption(f"⚡ Cached answer to a similar question (\"{cached['question']}\", similarity "
+                       f"{cached['similarity']:.2f}) in {(time.perf_counter() - t0) * 1000:.0f} ms")
+            with st.expander("Source passages"):
+                for r in cached["sources"]:
+                    st.markdown(f"> {r['text']}")
+        else:
+            with st.spinner("Retrieving context..."):
+                # Retrieve a few more chunks than fit; the prompt budget keeps the best, minus overlaps
+                retrieved = proc.retrieve_relevant_chunks(
+                    user_query, 
+                    st.session_state["rag_chunks"], 
+                    top_k=6,
+                    q_vec=q_vec
+                )
+
+            # Build a chat prompt from the retrieved context, within the "chat" token budget
+            prompt, used = compile_prompt("chat", CHAT_PROMPT, [r["text"] for r in retrieved],
+                                          scores=[r["score"] for r in retrieved], mmr=PROMPT_MMR,
+                                          question=user_query)
+            retrieved = [retrieved[i] for i in used]
+
+            # Stream the answer into its bubble as tokens arrive
+            bubble = st.empty()
+            answer = ""
+            for delta in st.session_state["llm"].stream(prompt):
+                answer += delta
+                bubble.markdown(f"<div class='chat-bubble-ai'>🤖 <b>AI:</b> {answer}▌</div>", unsafe_allow_html=True)
+            answer = answer.strip()
+            bubble.markdown(f"<div class='chat-bubble-ai'>🤖 <b>AI:</b> {answer}</div>", unsafe_allow_html=True)
+            timing = st.session_state["llm"].call_metrics[-1] if st.session_state["llm"].call_metrics else None
+            if timing and timing.get("stream"):
+                st.caption(f"First token {timing['ttft_s']:.2f}s · total {timing['latency_s']:.2f}s")
+            if answer:
+                qcache.store(st.session_state["paper_id"], user_query, q_vec, answer, retrieved)
+        st.markdown("---")
+
+        # Update chat history
+        st.session_state["chat_history"].append({"user": user_query, "assistant": answer})
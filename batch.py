@@ -0,0 +1,159 @@
+"""Headless batch runner: analyze every PDF URL in a file as a staged pipeline.
+
+    python batch.py urls.txt -o results.jsonl
+
+Stages run in their own worker pools connected by bounded queues, so
+downloads, PDF parsing/embedding and LLM calls overlap across papers:
+
+    network (fetch) -> cpu (extract, chunk, embed) -> llm (analysis, CIR, UCR) -> writer
+
+Each finished paper is appended to the results JSONL and then to a checkpoint
+file; re-running the same command skips every URL already in the checkpoint.
+"""
+import argparse, json, os, queue, sys, threading, time, traceback
+
+from modules import LLMBackend, RAGResearchProcessorLLM, CIREstimator, LLMUCREvaluator, arxiv_id_from_url
+import telemetry
+
+_DONE = object()
+
+def summary_claims(analysis):
+    """The analysis' own abstract and findings, as the text whose claims UCR checks against the paper."""
+    findings = analysis.get("main_findings") or []
+    if isinstance(findings, str):
+        findings = [findings]
+    return ". ".join([analysis.get("abstract", "")] + [str(f) for f in findings])
+
+class BatchPipeline:
+    def __init__(self, llm, net_workers=4, cpu_workers=2, llm_workers=4, queue_size=8):
+        self.proc = RAGResearchProcessorLLM(llm)
+        self.cir = CIREstimator(llm)
+        self.ucr = LLMUCREvaluator(llm, retriever=self.proc)
+        self.workers = {"network": net_workers, "cpu": cpu_workers, "llm": llm_workers}
+        self.queue_size = queue_size
+
+    # ---- stages: each fills in fields of the per-paper record ----
+    def fetch(self, rec):
+        rec["sha256"], rec["_path"] = self.proc.fetch_document(rec["url"])
+
+    def extract(self, rec):
+        pages = self.proc.iter_cached_pages(rec["sha256"], rec["_path"])
+        # chunk straight off the page stream; the chunk arena is the document text
+        chunks = rec["_chunks"] = self.proc.create_rag_chunks(pages)
+        rec["_text"] = chunks.text
+        rec["pages"], rec["chunks"] = len(chunks.page_numbers), len(chunks)
+
+    def analyze(self, rec):
+        analysis = rec["analysis"] = self.proc.analyze_research_paper(rec["_text"])
+        rec["cir"] = self.cir.compute_cir(analysis.get("title", ""), analysis.get("abstract", ""),
+                                          arxiv_id_from_url(rec["url"]))
+        rec["ucr"] = self.ucr.analyze_claim_support(summary_claims(analysis), rec["_chunks"])
+
+    def _worker(self, name, fn, inbox, outbox, remaining, downstream):
+        while True:
+            rec = inbox.get()
+            if rec is _DONE:
+                with remaining["lock"]:
+                    remaining[name] -= 1
+                    last = remaining[name] == 0
+                if last:  # the stage has drained: stop every worker of the next one
+                    for _ in range(downstream):
+                        outbox.put(_DONE)
+                return
+            if "error" not in rec:
+                t0 = time.perf_counter()
+                try:
+                    fn(rec)
+                except Exception as e:
+                    rec["error"] = {"stage": name, "type": type(e).__name__, "message": str(e),
+                                    "traceback": traceback.format_exc(limit=5)}
+                rec["timings"][name] = round(time.perf_counter() - t0, 3)
+            outbox.put(rec)
+
+    def run(self, urls, on_result):
+        """Push urls through the pipeline, calling on_result(record) from this thread as each finishes."""
+        stages = [("network", self.fetch), ("cpu", self.extract), ("llm", self.analyze)]
+        queues = [queue.Queue(self.queue_size) for _ in range(len(stages) + 1)]
+        remaining = {"lock": threading.Lock(), **self.workers}
+        downstream = [self.workers[name] for name, _ in stages[1:]] + [1]  # the writer is this thread
+        threads = []
+        for (name, fn), inbox, outbox, n_next in zip(stages, queues, queues[1:], downstream):
+            for _ in range(self.workers[name]):
+                t = threading.Thread(target=self._worker, args=(name, fn, inbox, outbox, remaining, n_next),
+                                     daemon=True)
+                t.start()
+                threads.append(t)
+
+        def feed():
+            for url in urls:
+                queues[0].put({"url": url, "timings": {}})
+            for _ in range(self.workers["network"]):
+                queues[0].put(_DONE)
+        threading.Thread(target=feed, daemon=True).start()
+
+        while True:
+            rec = queues[-1].get()
+            if rec is _DONE:
+                break
+            on_result({k: v for k, v in rec.items() if not k.startswith("_")})
+        for t in threads:
+            t.join()
+
+def load_checkpoint(path, retry_failed=False):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn final line from a crash
+            if entry["status"] == "ok" or not retry_failed:
+                done.add(entry["url"])
+            else:
+                done.discard(entry["url"])
+    return done
+
+def _append(f, obj):
+    f.write(json.dumps(obj) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("urls", help="text file with one PDF URL per line")
+    ap.add_argument("-o", "--output", default="results.jsonl")
+    ap.add_argument("--checkpoint", help="defaults to <output>.ckpt")
+    ap.add_argument("--net-workers", type=int, default=4)
+    ap.add_argument("--cpu-workers", type=int, default=2)
+    ap.add_argument("--llm-workers", type=int, default=4)
+    ap.add_argument("--queue-size", type=int, default=8, help="max papers waiting between two stages")
+    ap.add_argument("--retry-failed", action="store_true", help="re-run URLs that failed in an earlier run")
+    ap.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    args = ap.parse_args(argv)
+    if args.metrics_port:
+        telemetry.start_http_server(args.metrics_port)
+
+    checkpoint = args.checkpoint or args.output + ".ckpt"
+    done = load_checkpoint(checkpoint, args.retry_failed)
+    with open(args.urls) as f:
+        urls = [u.strip() for u in f if u.strip() and not u.startswith("#")]
+    todo = [u for u in dict.fromkeys(urls) if u not in done]
+    print(f"{len(todo)} to process, {len(urls) - len(todo)} already done", file=sys.stderr)
+
+    pipeline = BatchPipeline(LLMBackend(), args.net_workers, args.cpu_workers, args.llm_workers, args.queue_size)
+    counts = {"ok": 0, "failed": 0}
+    with open(args.output, "a") as out, open(checkpoint, "a") as ckpt:
+        def on_result(rec):
+            status = "failed" if "error" in rec else "ok"
+            counts[status] += 1
+            _append(out, rec)  # result first: a crash in between re-runs the paper, never loses it
+            _append(ckpt, {"url": rec["url"], "status": status})
+            print(f"[{counts['ok'] + counts['failed']}/{len(todo)}] {status} {rec['url']}", file=sys.stderr)
+        pipeline.run(todo, on_result)
+    print(f"done: {counts['ok']} ok, {counts['failed']} failed", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""Truncated single-call analysis vs. section-windowed map-reduce: wall time, calls, text coverage.
+
+    python -m benchmarks.bench_analysis [--pages 5 40 200] [--latency 0.5]
+"""
+import argparse, sys, time
+import modules
+from benchmarks.fakes import FakeLLMBackend
+from benchmarks.synthetic import make_sentences
+
+SECTIONS = ["Introduction", "Related Work", "Method", "Experiments", "Results", "Discussion", "Conclusion"]
+
+def synthetic_paper(n_pages, sentences_per_page=30):
+    """Paper text with numbered section headings spread evenly over n_pages, plus a references list."""
+    lines = ["Synthetic Attention Benchmarks", "A. Author, B. Author", "Abstract",
+             " ".join(make_sentences(5, seed=99))]
+    per_section = max(1, n_pages // len(SECTIONS))
+    for p in range(n_pages):
+        if p % per_section == 0 and p // per_section < len(SECTIONS):
+            lines.append(f"{p // per_section + 1} {SECTIONS[p // per_section]}")
+        lines.append(" ".join(make_sentences(sentences_per_page, seed=p)))
+    lines += ["References"] + [f"[{i}] A. Author. Paper {i}. 2020." for i in range(1, 60)]
+    return "\n".join(lines)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, nargs="+", default=[5, 40, 200])
+    ap.add_argument("--latency", type=float, default=0.5, help="fake LLM seconds per call")
+    args = ap.parse_args()
+    print(f"{'pages':>6} {'chars':>8} {'mode':<11} {'calls':>6} {'wall s':>7} {'text seen':>10}")
+    for n in args.pages:
+        text = synthetic_paper(n)
+        for mode in ("truncated", "map-reduce"):
+            llm = FakeLLMBackend(latency=args.latency)
+            proc = modules.RAGResearchProcessorLLM(llm, cache_dir=None)
+            t0 = time.perf_counter()
+            if mode == "truncated":
+                # the original behaviour: one call over the first 8,000 characters
+                proc.analyze_research_paper(text[:8000], window_chars=8000)
+                seen = min(len(text), 8000)
+            else:
+                proc.analyze_research_paper(text)
+                seen = len(text) - len(text[text.rindex("\nReferences\n"):])  # everything but the references
+            print(f"{n:>6} {len(text):>8} {mode:<11} {llm.calls:>6} {time.perf_counter() - t0:>7.2f} "
+                  f"{seen / len(text):>10.0%}")
+
+if __name__ == "__main__":
+    sys.exit(main())
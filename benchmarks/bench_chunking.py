@@ -0,0 +1,59 @@
+"""Character/sentence chunker vs. the token-budgeted ChunkStore: chunk count, window fill, memory.
+
+    python -m benchmarks.bench_chunking [--pages 50 300] [--embedder minilm]
+"""
+import argparse, re, sys, time, tracemalloc
+import modules
+from benchmarks.fakes import HashingEmbedder
+from benchmarks.synthetic import make_sentences
+
+def legacy_chunks(pages, chunk_size=500):
+    # the original create_rag_chunks loop, minus the embedding
+    chunks = []
+    for p in pages:
+        text = p["content"]
+        if not text.strip(): continue
+        sentences = re.split(r"[.!?]+", text)
+        buf = ""
+        for s in sentences:
+            if len(buf) + len(s) < chunk_size:
+                buf += s + ". "
+            else:
+                chunks.append({"page": p["page_number"], "content": buf})
+                buf = s + ". "
+        if buf: chunks.append({"page": p["page_number"], "content": buf})
+    return chunks
+
+def measure(build):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    chunks = build()
+    elapsed = time.perf_counter() - t0
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return chunks, elapsed, size
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, nargs="+", default=[50, 300])
+    ap.add_argument("--overlap", type=int, default=32)
+    ap.add_argument("--embedder", choices=["hash", "minilm"], default="hash")
+    args = ap.parse_args()
+    embedder = HashingEmbedder() if args.embedder == "hash" else None
+    proc = modules.RAGResearchProcessorLLM(None, cache_dir=None, embedder=embedder)
+    window = getattr(proc.embedder, "max_seq_length", 256)
+    print(f"{'pages':>6} {'chunker':<10} {'chunks':>7} {'tokens/chunk':>13} {'fill':>6} {'over window':>12} "
+          f"{'build ms':>9} {'memory KiB':>11}")
+    for n in args.pages:
+        pages = [{"page_number": i + 1, "content": " ".join(make_sentences(40, seed=i))} for i in range(n)]
+        old, old_s, old_mem = measure(lambda: legacy_chunks(pages))
+        new, new_s, new_mem = measure(lambda: modules.ChunkStore.from_pages(
+            iter(pages), proc.count_tokens, window - 2, args.overlap))
+        for name, chunks, secs, mem in (("legacy", old, old_s, old_mem), ("chunkstore", new, new_s, new_mem)):
+            tokens = [t + 2 for t in proc.count_tokens(modules.chunk_texts(chunks))]  # + [CLS]/[SEP]
+            print(f"{n:>6} {name:<10} {len(chunks):>7} {sum(tokens) / len(tokens):>13.1f} "
+                  f"{sum(tokens) / len(tokens) / window:>6.0%} {sum(t > window for t in tokens):>12} "
+                  f"{secs * 1000:>9.1f} {mem / 1024:>11.0f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
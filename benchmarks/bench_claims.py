@@ -0,0 +1,110 @@
+"""Claim support: LLM-only vs. NLI pre-screen + LLM — LLM calls, calls avoided, agreement, wall time.
+
+    python -m benchmarks.bench_claims [--pages 60] [--latency 0.3] [--nli-model cross-encoder/nli-deberta-v3-xsmall]
+
+Claims come from the labelled paper of bench_retrieval, a quarter of each kind:
+verbatim planted sentences and paraphrases of them (supported), the same
+sentence with another paper term swapped in, and fabricated claims about a
+paper term (unsupported). They are checked in answers of --per-answer claims,
+as analyze_claim_support does. Agreement is per claim, between the pre-screen
+run and the LLM-only run; accuracy is against the labels.
+
+The default LLM is a fake judge that reads the prompt (a claim is supported
+when a sentence of a cited passage is, in order, at least 70% of its words) and
+the default NLI model is benchmarks.fakes.OverlapCrossEncoder. Both rest on word
+overlap, so that run only checks the plumbing and call counting; its agreement
+says nothing about the thresholds. Measure them with --nli-model (a real
+sentence-transformers cross-encoder) and --groq (the real LLM, $GROQ_API_KEY).
+"""
+import argparse, json, random, re, sys, time
+from collections import Counter
+import modules
+from benchmarks.bench_retrieval import labelled_paper
+from benchmarks.fakes import FakeLLMBackend, HashingEmbedder, OverlapCrossEncoder
+
+TERM = re.compile(r"\b\w*(?:\d|[A-Z]{2})\w*\b")
+
+def supports(sentence, claim):
+    """sentence's words appear in claim in order and make up at least 70% of it."""
+    it = iter(claim)
+    tokens = re.findall(r"\w+", sentence.lower())
+    return len(tokens) >= 0.7 * len(claim) and all(t in it for t in tokens)
+
+def judge(messages):
+    """Fake LLM verdicts for a claim-support prompt, from the passages each claim cites."""
+    prompt = messages[-1]["content"]
+    passages = dict(re.findall(r"^\[(P\d+)\] (.*)$", prompt, re.M))
+    rows = []
+    for line in prompt.split("\nClaims:\n", 1)[1].split("\n\n", 1)[0].splitlines():
+        item = json.loads(line)
+        claim = re.findall(r"\w+", item["claim"].lower())
+        ok = any(supports(sentence, claim) for p in item["evidence"] if p in passages
+                 for sentence in re.split(r"[.!?]+", passages[p]))
+        rows.append({"id": item["id"], "verdict": "SUPPORTED" if ok else "UNSUPPORTED"})
+    return json.dumps(rows)
+
+def labelled_claims(queries, seed=0):
+    """[(claim, supported)] with verbatim, paraphrased, swapped-term and fabricated claims."""
+    rng = random.Random(seed)
+    planted = [(TERM.findall(s)[0], s) for kind, _, s in queries if kind == "exact"]
+    terms, bodies = Counter(t for t, _ in planted), Counter(s.split(" ", 2)[2] for _, s in planted)
+    # a term or sentence planted twice would make the swapped claims true
+    planted = [(t, s) for t, s in planted if terms[t] == 1 and bodies[s.split(" ", 2)[2]] == 1]
+    out = []
+    for n, (term, sentence) in enumerate(planted):
+        body = sentence[len(f"On {term} "):].rstrip(".")
+        other = planted[(n + 1) % len(planted)][0]
+        out += [(sentence.rstrip("."), True),
+                (f"On {term} the authors found that {body}", True),
+                (f"On {other} {body}", False),
+                (f"We fine-tune {term} with reinforcement learning from human preference feedback", False)]
+    rng.shuffle(out)
+    return out
+
+def run(ucr, claims, chunks, per_answer):
+    verdicts, stats = [], {"local_decisions": 0, "llm_calls": 0, "llm_calls_avoided": 0}
+    t0 = time.perf_counter()
+    for i in range(0, len(claims), per_answer):
+        s = {}
+        verdicts += ucr.verify_claims(claims[i:i + per_answer], chunks, s)
+        for k in stats:
+            stats[k] += s[k]
+    return verdicts, stats, time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=60)
+    ap.add_argument("--terms", type=int, default=40)
+    ap.add_argument("--per-answer", type=int, default=12, help="claims per analyze_claim_support call")
+    ap.add_argument("--latency", type=float, default=0.3, help="fake LLM seconds per call")
+    ap.add_argument("--nli-model", help="sentence-transformers cross-encoder (default: fake overlap model)")
+    ap.add_argument("--support", type=float, default=0.9)
+    ap.add_argument("--reject", type=float, default=0.1)
+    ap.add_argument("--groq", action="store_true", help="use the real LLM instead of the fake judge")
+    args = ap.parse_args()
+    pages, queries = labelled_paper(args.pages, args.terms)
+    proc = modules.RAGResearchProcessorLLM(None, cache_dir=None, embedder=HashingEmbedder(), retrieval="lexical")
+    chunks = proc.create_rag_chunks(pages)
+    claims, labels = zip(*labelled_claims(queries))
+    llm = modules.LLMBackend() if args.groq else FakeLLMBackend(latency=args.latency, reply=judge)
+    nli = modules.NLIPrescreen(args.nli_model or "fake-overlap", args.support, args.reject,
+                               model=None if args.nli_model else OverlapCrossEncoder())
+
+    baseline, base_stats, base_secs = run(modules.LLMUCREvaluator(llm, retriever=proc, prescreen=False),
+                                          claims, chunks, args.per_answer)
+    screened, stats, secs = run(modules.LLMUCREvaluator(llm, retriever=proc, prescreen=nli),
+                                claims, chunks, args.per_answer)
+    print(f"{len(claims)} claims ({sum(labels)} supported) in answers of {args.per_answer}, "
+          f"NLI {nli.model_name} support>={args.support} reject<={args.reject}")
+    print(f"{'mode':<14} {'LLM calls':>10} {'avoided':>8} {'local':>6} {'accuracy':>9} {'agreement':>10} "
+          f"{'seconds':>8}")
+    for name, verdicts, st, t in (("llm-only", baseline, base_stats, base_secs), ("nli+llm", screened, stats, secs)):
+        accuracy = sum(v == l for v, l in zip(verdicts, labels)) / len(labels)
+        agreement = sum(v == b for v, b in zip(verdicts, baseline)) / len(baseline)
+        print(f"{name:<14} {st['llm_calls']:>10} {st['llm_calls_avoided']:>8} {st['local_decisions']:>6} "
+              f"{accuracy:>9.3f} {agreement:>10.3f} {t:>8.2f}")
+    if not (args.nli_model and args.groq):
+        print("fake NLI model and/or LLM: agreement is not a measurement of the real pre-screen")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Chunk embedding storage: float32 vs. float16 vs. int8 codes — bytes per 10k chunks, top-k agreement, latency.
+
+    python -m benchmarks.bench_embeddings [--chunks 10000] [--queries 200] [-k 5] [--embedder minilm]
+
+Agreement is measured against the float32 index on the same vectors: the
+share of float32's top-k found in the quantized top-k, and how often the
+top-1 chunk is the same. Metadata compares per-chunk {"page", "content"}
+dicts with the ChunkStore arrays, both including the chunk text.
+"""
+import argparse, statistics, sys, tempfile, time, tracemalloc
+import numpy as np
+import modules
+from benchmarks.fakes import HashingEmbedder
+from benchmarks.synthetic import make_sentences
+
+def pages_for(n_chunks, sentences_per_chunk=8):
+    return [{"page_number": i // 20 + 1, "content": " ".join(make_sentences(sentences_per_chunk, seed=i))}
+            for i in range(n_chunks)]
+
+def metadata_bytes(pages):
+    """Traced bytes of the legacy list of dicts vs. a ChunkStore over the same chunk boundaries."""
+    texts = [p["content"] for p in pages]
+    tracemalloc.start()
+    legacy = [{"page": p["page_number"], "content": "".join(t)} for p, t in zip(pages, texts)]
+    legacy_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    offsets = np.cumsum([0] + [len(t) + 1 for t in texts])
+    store = modules.ChunkStore("\n".join(texts) + "\n", offsets[:-1], offsets[1:] - 1,
+                               [p["page_number"] for p in pages])
+    del legacy
+    return legacy_bytes, store.nbytes
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=10000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--embedder", choices=["hash", "minilm"], default="hash")
+    args = ap.parse_args()
+    embedder = HashingEmbedder() if args.embedder == "hash" else modules.shared_embedder("all-MiniLM-L6-v2")
+    pages = pages_for(args.chunks)
+    texts = [p["content"] for p in pages]
+    queries = modules._normalize(embedder.encode([" ".join(make_sentences(2, seed=10**6 + i))
+                                                  for i in range(args.queries)]))
+    per_10k = 10000 / args.chunks
+
+    legacy_meta, store_meta = metadata_bytes(pages)
+    print(f"{args.chunks} chunks, {args.queries} queries, k={args.k}, dim={queries.shape[1]}")
+    print(f"metadata per 10k chunks: dicts {legacy_meta * per_10k / 2**20:.2f} MiB, "
+          f"ChunkStore {store_meta * per_10k / 2**20:.2f} MiB")
+
+    with tempfile.TemporaryDirectory() as cache:
+        indexes = {dtype: modules.ChunkIndex.load_or_build(embedder, texts, "bench", cache, dtype)
+                   for dtype in modules.EMBEDDING_DTYPES}
+        reference = [set(indexes["float32"].search(q, args.k)[0].tolist()) for q in queries]
+        top1 = [indexes["float32"].search(q, 1)[0][0] for q in queries]
+        print(f"{'dtype':<8} {'MiB / 10k':>10} {'top-k overlap':>14} {'top-1 same':>11} {'p50 ms':>8}")
+        for dtype, index in indexes.items():
+            overlap, same, times = [], [], []
+            for q, ref, t1 in zip(queries, reference, top1):
+                t0 = time.perf_counter()
+                idx, _ = index.search(q, args.k)
+                times.append(time.perf_counter() - t0)
+                overlap.append(len(ref & set(idx.tolist())) / len(ref))
+                same.append(bool(idx[0] == t1))
+            print(f"{dtype:<8} {index.nbytes * per_10k / 2**20:>10.2f} {statistics.mean(overlap):>14.3f} "
+                  f"{statistics.mean(same):>11.3f} {statistics.median(times) * 1000:>8.2f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Serial pdfplumber loop vs. pooled streaming page extraction.
+
+    python -m benchmarks.bench_extract [--pages 10 100 500]
+"""
+import argparse, os, tempfile, time
+import pdfplumber
+import modules
+from benchmarks.synthetic import write_pdf
+
+def serial_baseline(path):
+    # the original extract_document_text loop, minus the download
+    full_text, pages = "", []
+    with pdfplumber.open(path) as pdf:
+        for i, page in enumerate(pdf.pages):
+            text = page.extract_text() or ""
+            full_text += text + "\n"
+            pages.append({"page_number": i + 1, "content": text})
+    return full_text, pages
+
+def streaming(path):
+    first, texts = None, []
+    t0 = time.perf_counter()
+    for text in modules.iter_pdf_pages(path, backend="pdfplumber"):
+        if first is None:
+            first = time.perf_counter() - t0
+        texts.append(text)
+    return "".join(t + "\n" for t in texts), first
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    args = ap.parse_args()
+    print(f"workers={modules.PAGE_WORKERS}")
+    print(f"{'pages':>6} {'serial s':>9} {'pooled s':>9} {'speedup':>8} {'first page s':>13}")
+    with tempfile.TemporaryDirectory() as d:
+        list(modules.iter_pdf_pages(write_pdf(os.path.join(d, "warm.pdf"), 32), backend="pdfplumber"))  # start the pool
+        for n in args.pages:
+            path = write_pdf(os.path.join(d, f"{n}.pdf"), n)
+            t0 = time.perf_counter()
+            ref, _ = serial_baseline(path)
+            t_serial = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            text, first = streaming(path)
+            t_pool = time.perf_counter() - t0
+            assert text == ref, "pooled extraction diverged from serial output"
+            print(f"{n:>6} {t_serial:>9.2f} {t_pool:>9.2f} {t_serial / t_pool:>7.2f}x {first:>13.3f}")
+
+if __name__ == "__main__":
+    main()
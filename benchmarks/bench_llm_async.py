@@ -0,0 +1,36 @@
+"""Load-test LLMBackend.achat and its token-bucket scheduler against the fake Groq server.
+
+    python -m benchmarks.bench_llm_async --calls 200 --rpm 300 --server-rpm 320
+"""
+import argparse, asyncio, statistics, time
+import modules
+from benchmarks.fake_groq import FakeGroqServer
+
+async def run(llm, calls):
+    t0 = time.perf_counter()
+    await asyncio.gather(*(llm.achat(f"question {i}", cache=False) for i in range(calls)))
+    return time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=200)
+    ap.add_argument("--rpm", type=int, default=300, help="scheduler budget")
+    ap.add_argument("--tpm", type=int, default=10 ** 6)
+    ap.add_argument("--in-flight", type=int, default=16)
+    ap.add_argument("--server-rpm", type=int, default=320, help="limit enforced by the fake server")
+    ap.add_argument("--latency", type=float, default=0.05)
+    args = ap.parse_args()
+    server = FakeGroqServer(rpm=args.server_rpm, latency=args.latency).start()
+    scheduler = modules.TokenBucketScheduler(args.rpm, args.tpm, args.in_flight)
+    llm = modules.LLMBackend(api_key="offline", base_url=server.url, cache=False, scheduler=scheduler)
+    wall = asyncio.run(run(llm, args.calls))
+    lat = sorted(m["total_s"] for m in llm.call_metrics)
+    retries = sum(m["attempts"] - 1 for m in llm.call_metrics)
+    print(f"calls={args.calls} wall={wall:.2f}s throughput={args.calls / wall * 60:.0f}/min "
+          f"(budget {args.rpm}/min)")
+    print(f"p50={statistics.median(lat):.3f}s p95={lat[int(0.95 * (len(lat) - 1))]:.3f}s "
+          f"server_429s={server.throttled} retries={retries}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
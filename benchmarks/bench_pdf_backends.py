@@ -0,0 +1,46 @@
+"""PDF text backends: pages/second and agreement with pdfplumber, per document.
+
+    python -m benchmarks.bench_pdf_backends [--pages 20 200] [--pdf paper.pdf ...]
+
+Each backend runs serially in-process (parallel=False), including its
+per-page pdfplumber fallback. Agreement is the mean per-page similarity
+(difflib ratio) to pdfplumber's text with whitespace removed, since the
+backends differ mostly in where they put spaces and line breaks.
+"""
+import argparse, difflib, os, re, statistics, sys, tempfile, time
+import modules
+from benchmarks.synthetic import write_pdf
+
+def agreement(reference, texts):
+    ratios = []
+    for a, b in zip(reference, texts):
+        a, b = re.sub(r"\s+", "", a), re.sub(r"\s+", "", b)
+        ratios.append(difflib.SequenceMatcher(None, a, b).ratio() if a or b else 1.0)
+    return statistics.mean(ratios) if ratios else 1.0
+
+def fallbacks(backend):
+    return modules.METRICS.value("pdf_page_fallbacks_total", backend=backend)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, nargs="*", default=[20, 200], help="synthetic documents to generate")
+    ap.add_argument("--pdf", nargs="*", default=[], help="real PDFs to include (e.g. downloaded arXiv papers)")
+    args = ap.parse_args()
+    print(f"{'document':<28} {'backend':<11} {'pages':>6} {'pages/s':>9} {'speedup':>8} {'agreement':>10} "
+          f"{'fallbacks':>10}")
+    with tempfile.TemporaryDirectory() as d:
+        docs = [write_pdf(os.path.join(d, f"synthetic-{n}.pdf"), n) for n in args.pages] + args.pdf
+        for path in docs:
+            results = {}
+            for backend in ("pdfplumber", "pdfminer", "pypdfium2"):
+                before = fallbacks(backend)
+                t0 = time.perf_counter()
+                texts = list(modules.iter_pdf_pages(path, parallel=False, backend=backend))
+                results[backend] = (texts, time.perf_counter() - t0, fallbacks(backend) - before)
+            reference, base, _ = results["pdfplumber"]
+            for backend, (texts, secs, fell_back) in results.items():
+                print(f"{os.path.basename(path)[:28]:<28} {backend:<11} {len(texts):>6} {len(texts) / secs:>9.1f} "
+                      f"{base / secs:>7.1f}x {agreement(reference, texts):>10.3f} {fell_back:>10}")
+
+if __name__ == "__main__":
+    sys.exit(main())
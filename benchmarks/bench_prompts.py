@@ -0,0 +1,91 @@
+"""Concatenated vs. budget-packed prompts: estimated prompt tokens and evidence kept, per call site.
+
+    python -m benchmarks.bench_prompts [--pages 60] [--chat-budget 1000] [--mmr 0.7]
+
+Uses the labelled paper of bench_retrieval: every query has one planted
+sentence that answers it. "evidence kept" is the share of queries (chat) or
+claims (UCR) whose planted sentence made it into the prompt; "legacy" rebuilds
+the prompts as the call sites did before they went through compile_prompt.
+"""
+import argparse, json, sys
+import modules
+from benchmarks.bench_retrieval import labelled_paper
+from benchmarks.fakes import FakeLLMBackend, HashingEmbedder, canned_reply
+
+CHAT_PROMPT = """You are a research assistant. Use the following context from the paper to answer the question.
+
+Context:
+{context}
+Question: {question}
+Answer: """
+
+def legacy_ucr_prompt(batch):
+    passages, refs = {}, []
+    for _, _, ev in batch:
+        refs.append([passages.setdefault(t, f"P{len(passages) + 1}") for t in ev])
+    lines = [f"[{pid}] {t}" for t, pid in passages.items()]
+    items = [json.dumps({"id": cid, "claim": c, "evidence": ids}) for (cid, c, _), ids in zip(batch, refs)]
+    return ("For each claim, decide whether its evidence passages support it.\n\n"
+            "Passages:\n" + "\n\n".join(lines) + "\n\nClaims:\n" + "\n".join(items) +
+            '\n\nRespond with only a JSON array: [{"id": <id>, "verdict": "SUPPORTED" or "UNSUPPORTED"}, ...]')
+
+def row(name, tokens, kept):
+    print(f"  {name:<22} {sum(tokens) / len(tokens):>12.0f} {sum(kept) / len(kept):>15.2f}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=60)
+    ap.add_argument("--terms", type=int, default=40)
+    ap.add_argument("--chat-budget", type=int, default=modules.prompt_budget("chat"))
+    ap.add_argument("--mmr", type=float, default=0.7)
+    ap.add_argument("--evidence-k", type=int, default=2)
+    args = ap.parse_args()
+    pages, queries = labelled_paper(args.pages, args.terms)
+    proc = modules.RAGResearchProcessorLLM(None, cache_dir=None, embedder=HashingEmbedder(), retrieval="hybrid")
+    chunks = proc.create_rag_chunks(pages)
+    count = modules.estimate_tokens
+
+    print(f"chat: {len(queries)} questions, budget {args.chat_budget} tokens")
+    print(f"  {'prompt':<22} {'mean tokens':>12} {'evidence kept':>15}")
+    legacy, packed, mmr = ([], []), ([], []), ([], [])
+    for _, query, sentence in queries:
+        top3 = proc.retrieve_relevant_chunks(query, chunks, top_k=3)
+        prompt = CHAT_PROMPT.format(context="\n\n".join(r["text"] for r in top3), question=query)
+        legacy[0].append(count(prompt))
+        legacy[1].append(sentence in prompt)
+        top6 = proc.retrieve_relevant_chunks(query, chunks, top_k=6)
+        for out, lam in ((packed, None), (mmr, args.mmr)):
+            prompt, _ = modules.compile_prompt("chat", CHAT_PROMPT, [r["text"] for r in top6],
+                                               scores=[r["score"] for r in top6], mmr=lam,
+                                               budget=args.chat_budget, question=query)
+            out[0].append(count(prompt))
+            out[1].append(sentence in prompt)
+    row("legacy top-3", *legacy)
+    row("packed top-6", *packed)
+    row(f"packed top-6, mmr {args.mmr}", *mmr)
+
+    claims = [query for kind, query, _ in queries if kind == "mixed"]
+    planted = [sentence for kind, _, sentence in queries if kind == "mixed"]
+    prompts = []
+    llm = FakeLLMBackend(reply=lambda messages: prompts.append(messages[-1]["content"]) or canned_reply(messages))
+    ucr = modules.LLMUCREvaluator(llm, retriever=proc, evidence_k=args.evidence_k, prescreen=False)
+    evidence = ucr._evidence(claims, chunks)
+    items = list(zip(range(len(claims)), claims, evidence))
+    batches = [items[i:i + ucr.batch_size] for i in range(0, len(items), ucr.batch_size)]
+    print(f"\nucr: {len(claims)} claims in {len(batches)} batches, evidence_k={args.evidence_k}, "
+          f"budget {modules.prompt_budget('ucr')} tokens")
+    print(f"  {'prompt':<22} {'mean tokens':>12} {'evidence kept':>15}")
+    old = [legacy_ucr_prompt(b) for b in batches]
+    for b in batches:
+        ucr._verify_batch(b)
+    for name, texts in (("legacy", old), ("packed", prompts)):
+        kept = [planted[cid] in text for b, text in zip(batches, texts) for cid, _, _ in b]
+        row(name, [count(t) for t in texts], kept)
+
+    print("\nprompt tokens by call site (this run)")
+    for (name, labels), value in sorted(modules.METRICS.counters.items()):
+        if name in ("prompt_tokens_total", "prompt_context_dropped_tokens_total"):
+            print(f"  {dict(labels)['site']:<8} {name:<38} {value:>9}")
+
+if __name__ == "__main__":
+    sys.exit(main())
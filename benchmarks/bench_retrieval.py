@@ -0,0 +1,71 @@
+"""Dense vs. BM25 vs. hybrid (RRF) retrieval: recall@k, MRR and latency on a labelled query set.
+
+    python -m benchmarks.bench_retrieval [--pages 60] [--embedder minilm]
+
+The synthetic paper has rare exact terms (dataset names, acronyms, equation
+labels) planted in single sentences. "exact" queries ask about one term in
+generic words; "mixed" queries add three of the paper's common content words,
+which dilute a dense query vector. A hit is a returned chunk containing the
+planted sentence. Synthetic text has a tiny vocabulary, so purely topical
+queries cannot be labelled; run with --embedder minilm on real papers for those.
+"""
+import argparse, random, statistics, sys, time
+import modules
+from benchmarks.fakes import HashingEmbedder
+from benchmarks.synthetic import make_sentences
+
+def labelled_paper(n_pages, n_terms, seed=0):
+    rng = random.Random(seed)
+    pages, planted = [], []
+    for p in range(n_pages):
+        sentences = make_sentences(30, seed=p)
+        if len(planted) < n_terms:
+            kind = rng.choice(["dataset", "acronym", "equation"])
+            term = {"dataset": f"Zeta{rng.randint(100, 999)}QA",
+                    "acronym": "".join(rng.choice("BCDFGHJKLMNPQRSTVWXZ") for _ in range(4)),
+                    "equation": f"Eq{rng.randint(10, 99)}b"}[kind]
+            filler = make_sentences(1, seed=10_000 + p)[0].rstrip(".").lower().split()[:8]
+            sentence = f"On {term} the {' '.join(filler)}."
+            sentences.insert(rng.randrange(30), sentence)
+            planted.append((term, sentence))
+        pages.append({"page_number": p + 1, "content": " ".join(sentences)})
+    queries = []
+    for term, sentence in planted:
+        queries.append(("exact", f"What results are reported for {term}?", sentence))
+        context = rng.sample(sentence.rstrip(".").split()[2:], 3)
+        queries.append(("mixed", f"How does {term} affect {' '.join(context)}?", sentence))
+    return pages, queries
+
+def evaluate(proc, chunks, queries, mode, k):
+    rows = {}
+    for kind, query, sentence in queries:
+        t0 = time.perf_counter()
+        results = proc.retrieve_relevant_chunks(query, chunks, top_k=k, mode=mode)
+        elapsed = time.perf_counter() - t0
+        rank = next((i + 1 for i, r in enumerate(results) if sentence in r["text"]), None)
+        rows.setdefault(kind, []).append((rank, elapsed))
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=60)
+    ap.add_argument("--terms", type=int, default=40)
+    ap.add_argument("-k", type=int, default=3)
+    ap.add_argument("--embedder", choices=["hash", "minilm"], default="hash")
+    args = ap.parse_args()
+    pages, queries = labelled_paper(args.pages, args.terms)
+    embedder = HashingEmbedder() if args.embedder == "hash" else None
+    proc = modules.RAGResearchProcessorLLM(None, cache_dir=None, embedder=embedder, retrieval="hybrid")
+    chunks = proc.create_rag_chunks(pages)
+    print(f"{len(chunks)} chunks, {len(queries)} queries, k={args.k}")
+    print(f"{'mode':<8} {'queries':<8} {'recall@k':>9} {'MRR':>6} {'p50 ms':>8}")
+    for mode in ("dense", "lexical", "hybrid"):
+        evaluate(proc, chunks, queries[:2], mode, args.k)  # warm-up
+        for kind, rows in evaluate(proc, chunks, queries, mode, args.k).items():
+            recall = sum(r is not None for r, _ in rows) / len(rows)
+            mrr = sum(1 / r for r, _ in rows if r) / len(rows)
+            p50 = statistics.median(t for _, t in rows) * 1000
+            print(f"{mode:<8} {kind:<8} {recall:>9.2f} {mrr:>6.2f} {p50:>8.2f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Cold-start benchmark: time to first render and to first (and second) analysis.
+
+    python -m benchmarks.bench_startup                   # this tree
+    python -m benchmarks.bench_startup --compare HEAD~1  # ... and an earlier commit, side by side
+
+Every measurement runs in a fresh interpreter with empty caches, against a
+synthetic PDF, the fake Groq server and a stub Semantic Scholar; only the
+embedding model is real. With Streamlit installed the page itself is driven
+through streamlit.testing's AppTest (first render, then a click on "Run
+Analysis", then a second session's click). Without it the same steps run
+headless through modules: import, then the analysis the button triggers.
+--think-time waits between render and click, as a user typing a URL would.
+"""
+import argparse, io, json, os, subprocess, sys, tarfile, tempfile, time
+
+from benchmarks.fake_groq import FakeGroqServer
+from benchmarks.fakes import FakeSemanticScholar, canned_reply
+from benchmarks.suite import serve_dir
+from benchmarks.synthetic import write_pdf
+
+# Runs with the tree under test as cwd; prints one JSON line of wall-clock marks.
+CHILD = r"""
+import json, os, sys, time
+marks = {}
+mark = lambda name: marks.__setitem__(name, time.time())
+url, think = os.environ["BENCH_URL"], float(os.environ["BENCH_THINK"])
+if os.environ["BENCH_MODE"] == "app":
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file("app.py", default_timeout=600).run()
+    mark("first_render")
+    time.sleep(think)
+    for session in ("first_analysis", "second_analysis"):
+        if session == "second_analysis":
+            at = AppTest.from_file("app.py", default_timeout=600).run()
+        at.text_input[0].input(url)
+        at.button[0].click().run()
+        assert not at.exception, at.exception
+        mark(session)
+else:
+    import modules
+    getattr(modules, "preload", lambda: None)()  # what app.py does on first render, where available
+    mark("first_render")
+    time.sleep(think)
+    claims = "Self-attention replaced recurrence. It achieved state-of-the-art translation results."
+    for session in ("first_analysis", "second_analysis"):
+        llm = modules.LLMBackend()
+        proc = modules.RAGResearchProcessorLLM(llm)
+        text, pages = proc.extract_document_text(url)
+        analysis = proc.analyze_research_paper(text)
+        chunks = proc.create_rag_chunks(pages)
+        modules.CIREstimator(llm).compute_cir(analysis.get("title", ""), analysis.get("abstract", ""))
+        modules.LLMUCREvaluator(llm, retriever=proc).analyze_claim_support(claims, chunks)
+        mark(session)
+print("BENCH " + json.dumps(marks))
+"""
+
+def export_tree(ref, dest):
+    """Unpack the repository at ref into dest (tracked files only)."""
+    data = subprocess.run(["git", "archive", "--format=tar", ref], check=True, capture_output=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        tar.extractall(dest)
+    return dest
+
+def run_once(tree, mode, env):
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(env, PAPER_CACHE_DIR=cache, BENCH_MODE=mode)
+        t0 = time.time()
+        out = subprocess.run([sys.executable, "-c", CHILD], cwd=tree, env=env, capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(f"{tree}: {out.stderr.strip()[-2000:]}")
+    marks = json.loads(out.stdout.split("BENCH ", 1)[1])
+    think = float(env["BENCH_THINK"])
+    return {"first_render_s": marks["first_render"] - t0,
+            "first_analysis_s": marks["first_analysis"] - marks["first_render"] - think,
+            "second_analysis_s": marks["second_analysis"] - marks["first_analysis"]}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--compare", metavar="REF", help="also measure this git ref (e.g. the commit before a change)")
+    ap.add_argument("--mode", choices=["auto", "app", "headless"], default="auto")
+    ap.add_argument("--runs", type=int, default=3, help="cold starts per tree; the median is reported")
+    ap.add_argument("--think-time", type=float, default=0.0, help="seconds between first render and the click")
+    ap.add_argument("--pages", type=int, default=12)
+    ap.add_argument("--latency", type=float, default=0.2, help="fake Groq seconds per call")
+    args = ap.parse_args(argv)
+    mode = args.mode
+    if mode == "auto":
+        try:
+            import streamlit  # noqa: F401
+            mode = "app"
+        except ImportError:
+            mode = "headless"
+
+    with tempfile.TemporaryDirectory() as d:
+        write_pdf(os.path.join(d, "paper.pdf"), args.pages)
+        pdf_server = serve_dir(d)
+        groq = FakeGroqServer(latency=args.latency, reply=canned_reply).start()
+        s2 = FakeSemanticScholar().start()
+        env = dict(os.environ, GROQ_API_KEY="offline", GROQ_BASE_URL=groq.url, S2_API_URL=s2.url,
+                   BENCH_URL=f"http://127.0.0.1:{pdf_server.server_address[1]}/paper.pdf",
+                   BENCH_THINK=str(args.think_time))
+        trees = {"current": os.getcwd()}
+        if args.compare:
+            trees[args.compare] = export_tree(args.compare, os.path.join(d, "ref"))
+        results = {}
+        for name, tree in trees.items():
+            runs = [run_once(tree, mode, env) for _ in range(args.runs)]
+            results[name] = {k: sorted(r[k] for r in runs)[len(runs) // 2] for k in runs[0]}
+        for server in (pdf_server, groq, s2):
+            server.shutdown()
+
+    print(f"mode={mode} runs={args.runs} think_time={args.think_time}s")
+    print(f"{'tree':<12} {'first render':>13} {'first analysis':>15} {'second analysis':>16}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['first_render_s']:>12.2f}s {r['first_analysis_s']:>14.2f}s "
+              f"{r['second_analysis_s']:>15.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""IVF vector store vs. brute force: build time, query latency and recall@k.
+
+    python -m benchmarks.bench_vector_store --rows 1000000 --nprobe 8 16 32
+"""
+import argparse, statistics, tempfile, time
+import numpy as np
+from vector_store import VectorStore
+
+def unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+def paper_vectors(rng, topics, n):
+    # chunks of one paper sit near a paper centroid, which sits near a topic centroid
+    centre = unit(topics[rng.integers(len(topics))] + 0.5 * unit(rng.standard_normal(topics.shape[1])))
+    return unit(centre + 0.7 * unit(rng.standard_normal((n, topics.shape[1]))))
+
+def timed(fn, queries):
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return statistics.median(lat), lat[int(0.95 * (len(lat) - 1))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--chunks-per-paper", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    args = ap.parse_args()
+    rng = np.random.default_rng(0)
+    topics = unit(rng.standard_normal((100, args.dim)))
+    with tempfile.TemporaryDirectory() as d:
+        store = VectorStore(d, dim=args.dim)
+        t0, adds = time.perf_counter(), []
+        for start in range(0, args.rows, args.chunks_per_paper):
+            n = min(args.chunks_per_paper, args.rows - start)
+            vecs = paper_vectors(rng, topics, n)
+            t1 = time.perf_counter()
+            store.add(f"paper-{start // args.chunks_per_paper}", vecs, np.arange(n) // 10 + 1, [""] * n)
+            adds.append(time.perf_counter() - t1)
+        store.train()
+        store.save()
+        tail = adds[-max(1, len(adds) // 10):]
+        print(f"rows={len(store)} lists={len(store.centroids)} build={time.perf_counter() - t0:.1f}s "
+              f"add: first 10% {1000 * statistics.mean(adds[:len(tail)]):.2f}ms/paper, "
+              f"last 10% {1000 * statistics.mean(tail):.2f}ms/paper")
+        # held-out queries: chunks of papers that are not in the store, so each query's neighbours are spread
+        # over nearby lists instead of sitting next to one stored row (which any nprobe finds)
+        queries = np.concatenate([paper_vectors(rng, topics, 1) for _ in range(args.queries)])
+        p50, p95 = timed(lambda q: store.search_ids(q, args.k, exact=True), queries)
+        print(f"{'brute force':>14}  p50={p50:7.2f}ms p95={p95:7.2f}ms recall@{args.k}=1.000")
+        for nprobe in args.nprobe:
+            p50, p95 = timed(lambda q: store.search_ids(q, args.k, nprobe=nprobe), queries)
+            recall = store.recall_at_k(queries[:50], args.k, nprobe=nprobe)
+            print(f"{'ivf nprobe=' + str(nprobe):>14}  p50={p50:7.2f}ms p95={p95:7.2f}ms recall@{args.k}={recall:.3f}")
+
+if __name__ == "__main__":
+    main()
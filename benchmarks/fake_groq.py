@@ -0,0 +1,108 @@
+"""Local Groq-compatible chat-completions server for offline load tests.
+
+Serves POST /openai/v1/chat/completions (plain or stream=True SSE) with canned
+replies, simulated latency and its own requests-per-minute limit (answering
+429 + Retry-After), so LLMBackend(base_url=server.url) can be exercised
+without network access.
+
+    python -m benchmarks.fake_groq --port 8099 --rpm 60 --latency 0.2
+"""
+import argparse, json, threading, time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, port=0, rpm=None, latency=0.0, reply=None, token_delay=0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.rpm, self.latency, self.token_delay = rpm, latency, token_delay
+        self.reply = reply or (lambda messages: "OK")
+        self.window = deque()
+        self.lock = threading.Lock()
+        self.served = self.throttled = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def admit(self):
+        """Sliding one-minute window; returns seconds until a slot frees, or 0 if admitted."""
+        with self.lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0] >= 60:
+                self.window.popleft()
+            if self.rpm and len(self.window) >= self.rpm:
+                self.throttled += 1
+                return 60 - (now - self.window[0])
+            self.window.append(now)
+            self.served += 1
+            return 0
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": "not found"}})
+        wait = self.server.admit()
+        if wait:
+            return self._send(429, {"error": {"message": "rate limit", "type": "tokens"}},
+                              [("Retry-After", f"{wait:.2f}")])
+        time.sleep(self.server.latency)
+        messages = body.get("messages", [])
+        content = self.server.reply(messages)
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4 + 1
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4 + 1,
+                 "total_tokens": prompt_tokens + len(content) // 4 + 1}
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+        if body.get("stream"):
+            return self._stream(base, content, usage)
+        self._send(200, dict(base, object="chat.completion", usage=usage, choices=[
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]))
+
+    def _stream(self, base, content, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = [w + " " for w in content.split(" ")]
+        pieces[-1] = pieces[-1][:-1]
+        for piece in pieces:
+            chunk = dict(base, object="chat.completion.chunk",
+                         choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.token_delay)
+        final = dict(base, object="chat.completion.chunk", x_groq={"usage": usage},
+                     choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--rpm", type=int, default=None)
+    ap.add_argument("--latency", type=float, default=0.0)
+    args = ap.parse_args()
+    server = FakeGroqServer(args.port, args.rpm, args.latency)
+    print(f"fake Groq API on {server.url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Deterministic offline stand-ins for the Groq LLM, the MiniLM embedder and Semantic Scholar."""
+import asyncio, hashlib, json, re, threading, time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import numpy as np
+import modules
+
+def canned_reply(messages):
+    """A plausible, deterministic answer for each prompt shape used in modules.py."""
+    prompt = messages[-1]["content"]
+    if "Claims:" in prompt:
+        ids = [int(i) for i in re.findall(r'"id": (\d+)', prompt)]
+        return json.dumps([{"id": i, "verdict": "UNSUPPORTED" if i % 4 == 3 else "SUPPORTED"} for i in ids])
+    if prompt.startswith("Rate novelty"):
+        return '{"novelty": 0.62}'
+    part = re.search(r"--- PART (\d+)/(\d+) ---", prompt)
+    if part:
+        i = int(part.group(1))
+        return json.dumps({"title": "Synthetic Attention Benchmarks" if i == 1 else "", "authors": [],
+                           "abstract": "", "key_concepts": [f"concept {i}"], "methodology": f"Method of part {i}.",
+                           "main_findings": [f"Finding reported in part {i} of the paper."]})
+    if "Extract this research paper info as JSON" in prompt or "Merge these partial extractions" in prompt:
+        return json.dumps({
+            "title": "Synthetic Attention Benchmarks", "authors": ["A. Author", "B. Author"],
+            "abstract": "We evaluate transformer encoder models on a synthetic retrieval benchmark and report accuracy.",
+            "key_concepts": ["attention", "retrieval", "benchmark"], "methodology": "Controlled synthetic evaluation.",
+            "main_findings": ["Attention layers improve retrieval accuracy over the convolution baseline.",
+                              "Latency grows linearly with the number of evaluated tokens in each sequence."]})
+    return "The paper reports results on a synthetic benchmark."
+
+def _completion(content, prompt_tokens):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(content) // 4 + 1,
+                            total_tokens=prompt_tokens + len(content) // 4 + 1)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+class _FakeCompletions:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _reply(self, messages):
+        self.backend.calls += 1
+        return self.backend.reply(messages), sum(len(m["content"]) for m in messages) // 4 + 1
+
+    def create(self, model, messages, temperature=0.2, stream=False):
+        time.sleep(self.backend.latency)
+        content, prompt_tokens = self._reply(messages)
+        if not stream:
+            return _completion(content, prompt_tokens)
+        return self._stream(content, prompt_tokens)
+
+    def _stream(self, content, prompt_tokens):
+        for word in content.split(" "):
+            time.sleep(self.backend.token_delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))], x_groq=None)
+        yield SimpleNamespace(choices=[], x_groq=_completion(content, prompt_tokens))
+
+class _FakeAsyncCompletions(_FakeCompletions):
+    async def create(self, model, messages, temperature=0.2, stream=False):
+        await asyncio.sleep(self.backend.latency)
+        content, prompt_tokens = self._reply(messages)
+        return _completion(content, prompt_tokens)
+
+class FakeLLMBackend(modules.LLMBackend):
+    """LLMBackend whose Groq client is replaced by canned JSON after a fixed latency; no API key needed.
+
+    Only the transport is faked, so caching, metrics and rate limiting run the real code.
+    """
+    def __init__(self, latency=0.0, token_delay=0.0, reply=canned_reply, model="fake-llm", cache=False,
+                 cache_nonzero_temperature=False, scheduler=None):
+        self.api_key, self.base_url, self.model = "offline", None, model
+        self.latency, self.token_delay, self.reply = latency, token_delay, reply
+        self.calls = 0
+        self.cache = None if cache is False else (cache or modules.LLMCache())
+        self.cache_nonzero_temperature = cache_nonzero_temperature
+        self.scheduler = scheduler or modules.TokenBucketScheduler(10 ** 6, 10 ** 9, 64)
+        self.call_metrics = deque(maxlen=1000)
+        self.client = SimpleNamespace(chat=SimpleNamespace(completions=_FakeCompletions(self)))
+        self._async_client = SimpleNamespace(chat=SimpleNamespace(completions=_FakeAsyncCompletions(self)))
+
+    def _aclient(self):
+        return self._async_client
+
+class HashingEmbedder:
+    """Bag-of-words feature hashing with SentenceTransformer's encode() shape; deterministic and model-free."""
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.max_seq_length = 256
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+                out[i, h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        return out
+
+class OverlapCrossEncoder:
+    """NLI cross-encoder stand-in: entailment grows with the share of the hypothesis' words found in the
+    premise sentence that holds most of them.
+
+    predict() returns (contradiction, entailment, neutral) logits per (premise, hypothesis) pair, like
+    the cross-encoder/nli-* models.
+    """
+    def __init__(self, sharpness=12.0, midpoint=0.75):
+        self.sharpness, self.midpoint = sharpness, midpoint
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        self.pairs += len(pairs)
+        out = np.zeros((len(pairs), 3), dtype=np.float32)
+        for i, (premise, hypothesis) in enumerate(pairs):
+            words = set(re.findall(r"\w+", hypothesis.lower()))
+            coverage = max(len(words & set(re.findall(r"\w+", sentence.lower())))
+                           for sentence in re.split(r"[.!?]+", premise)) / max(len(words), 1)
+            out[i, 1] = self.sharpness * (coverage - self.midpoint)
+        return out
+
+class FakeSemanticScholar(ThreadingHTTPServer):
+    """Answers /paper/search and /paper/batch with stable citation counts derived from the query.
+
+    status (e.g. 429 or 503) makes every request fail with that code and Retry-After: 0;
+    unknown_ids get a null row from /paper/batch; requests counts (method, path) pairs.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, status=None, unknown_ids=()):
+        super().__init__(("127.0.0.1", port), _S2Handler)
+        self.latency, self.status, self.unknown_ids = latency, status, set(unknown_ids)
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def _citations(key):
+    return int(hashlib.md5(key.encode()).hexdigest(), 16) % 500
+
+class _S2Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body):
+        time.sleep(self.server.latency)
+        self.server.requests.append((self.command, self.path.split("?")[0]))
+        data = json.dumps(body).encode()
+        self.send_response(self.server.status or 200)
+        if self.server.status:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._send({"data": [{"paperId": "s2-" + self.path, "citationCount": _citations(self.path)}]})
+
+    def do_POST(self):
+        ids = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))["ids"]
+        self._send([None if i in self.server.unknown_ids else {"paperId": i, "citationCount": _citations(i)}
+                    for i in ids])
@@ -0,0 +1,148 @@
+"""Offline per-stage benchmark suite with a regression gate.
+
+    python -m benchmarks.suite                     # compare with benchmarks/baseline.json
+    python -m benchmarks.suite --update-baseline   # record a new baseline
+
+The first run on a machine records the baseline; timings are only comparable
+on the same hardware, so the file is not checked in.
+
+Every external dependency is local: a synthetic PDF served over HTTP, the
+deterministic FakeLLMBackend, a stub Semantic Scholar and (by default) a
+hashing embedder. Each stage reports p50/p95 latency and throughput; the run
+exits non-zero when a stage's p50 is slower than baseline by more than
+--tolerance (and by more than --min-delta-ms).
+"""
+import argparse, functools, json, os, platform, sys, tempfile, threading, time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import modules
+from benchmarks.fakes import FakeLLMBackend, HashingEmbedder, FakeSemanticScholar
+from benchmarks.synthetic import make_sentences, write_pdf
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def serve_dir(path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=path))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def measure(fn, items, repeat, setup=None):
+    """Time fn() repeat times (after one warm-up); items = units of work per call, for throughput."""
+    if setup:
+        setup()
+    fn()
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    p50 = percentile(times, 0.5)
+    return {"p50_ms": round(p50 * 1000, 3), "p95_ms": round(percentile(times, 0.95) * 1000, 3),
+            "throughput_per_s": round(items / p50, 2) if p50 else None, "items": items}
+
+def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as d:
+        write_pdf(os.path.join(d, "paper.pdf"), args.pages)
+        pdf_server = serve_dir(d)
+        s2 = FakeSemanticScholar().start()
+        url = f"http://127.0.0.1:{pdf_server.server_address[1]}/paper.pdf"
+
+        llm = FakeLLMBackend(latency=args.latency)
+        embedder = HashingEmbedder() if args.embedder == "hash" else None
+        proc = modules.RAGResearchProcessorLLM(llm, cache_dir=None, embedder=embedder)
+        citations = modules.CitationLookup(base_url=s2.url, cache_path=os.path.join(d, "citations.sqlite"), ttl=0)
+        cir = modules.CIREstimator(llm, citations=citations)
+        ucr = modules.LLMUCREvaluator(llm, retriever=proc, prescreen=None if embedder is None else False)
+
+        text, pages = proc.extract_document_text(url)
+        results["extract_document_text"] = measure(lambda: proc.extract_document_text(url), len(pages), args.repeat)
+
+        chunks = proc.create_rag_chunks(pages)
+        results["create_rag_chunks"] = measure(lambda: proc.create_rag_chunks(pages), len(chunks), args.repeat,
+                                               setup=proc._indexes.clear)
+
+        queries = make_sentences(args.queries, seed=1)
+        results["retrieve_relevant_chunks"] = measure(
+            lambda: [proc.retrieve_relevant_chunks(q, chunks, top_k=3) for q in queries], len(queries), args.repeat)
+
+        claims = " ".join(make_sentences(args.claims, seed=2))
+        n_claims = ucr.analyze_claim_support(claims, chunks)["total"]
+        results["analyze_claim_support"] = measure(lambda: ucr.analyze_claim_support(claims, chunks), n_claims,
+                                                   args.repeat)
+
+        analysis = proc.analyze_research_paper(text)
+        results["compute_cir"] = measure(lambda: cir.compute_cir(analysis["title"], analysis["abstract"]), 1,
+                                         args.repeat)
+        pdf_server.shutdown()
+        s2.shutdown()
+    return results
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    failures = []
+    for stage, r in results.items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        ratio = r["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1.0
+        r["vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + tolerance and r["p50_ms"] - base["p50_ms"] > min_delta_ms:
+            failures.append(f"{stage}: p50 {r['p50_ms']}ms vs baseline {base['p50_ms']}ms ({ratio:.2f}x)")
+    return failures
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--claims", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--latency", type=float, default=0.02, help="fake LLM seconds per call")
+    ap.add_argument("--embedder", choices=["hash", "minilm"], default="hash")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before failing")
+    ap.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore slowdowns smaller than this (timer noise)")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--output", help="also write this run's results as JSON")
+    args = ap.parse_args(argv)
+
+    config = {k: getattr(args, k) for k in ("pages", "queries", "claims", "repeat", "latency", "embedder")}
+    results = run(args)
+    report = {"config": config, "machine": platform.platform(), "python": platform.python_version(),
+              "stages": results}
+
+    failures = []
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("baseline was recorded with a different config; not comparing", file=sys.stderr)
+        else:
+            failures = compare(results, baseline, args.tolerance, args.min_delta_ms)
+
+    print(f"{'stage':<26} {'p50 ms':>9} {'p95 ms':>9} {'items/s':>10} {'vs base':>8}")
+    for stage, r in results.items():
+        vs = f"{r['vs_baseline']:.2f}x" if "vs_baseline" in r else "-"
+        print(f"{stage:<26} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['throughput_per_s'] or 0:>10.1f} {vs:>8}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    for msg in failures:
+        print("REGRESSION " + msg, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
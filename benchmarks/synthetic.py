@@ -0,0 +1,50 @@
+"""Dependency-free generator for born-digital test PDFs of a controlled size."""
+import random
+
+VOCAB = ("attention transformer encoder decoder layer token embedding dataset benchmark "
+         "accuracy baseline training inference gradient optimizer model network residual "
+         "convolution sequence translation corpus evaluation metric ablation parameter "
+         "latency throughput retrieval citation novelty claim evidence result method").split()
+
+def make_sentences(n, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rng.choice(VOCAB) for _ in range(rng.randint(6, 16))]
+        out.append(" ".join(words).capitalize() + ".")
+    return out
+
+def _escape(s):
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(n_pages, lines_per_page=45, seed=0):
+    """Return bytes of an n_pages PDF with lines_per_page lines of pseudo-random prose."""
+    rng = random.Random(seed)
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for p in range(n_pages):
+        lines = [f"{p + 1}.{i} " + " ".join(rng.choice(VOCAB) for _ in range(10)) + "."
+                 for i in range(lines_per_page)]
+        body = ("BT /F1 9 Tf 40 760 Td 15 TL "
+                + " ".join(f"({_escape(l)}) '" for l in lines) + " ET").encode()
+        objs.append(b"<< /Length %d >>\nstream\n" % len(body) + body + b"\nendstream")
+        objs.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                    b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objs))
+        kids.append(len(objs))
+    objs[1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids)
+               + b"] /Count %d >>" % n_pages)
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % (i + 1) + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    return bytes(out)
+
+def write_pdf(path, n_pages, **kw):
+    with open(path, "wb") as f:
+        f.write(make_pdf(n_pages, **kw))
+    return path
@@ -0,0 +1,320 @@
+"""Local background job queue for paper analyses: SQLite-backed, no external broker.
+
+    python jobs.py --workers 4        # run a pool of worker processes until Ctrl-C
+    python jobs.py submit URL         # enqueue (or join the in-flight job for URL), print the job id
+    python jobs.py status JOB_ID      # print the job row as JSON
+
+Workers run modules.run_analysis, so every stage is memoized in the shared
+ArtifactStore and a job for an already-analyzed paper finishes in milliseconds.
+Progress is written per stage; the app polls it by job id. Submitting a URL
+with the same options as a queued or running job returns that job's id instead
+of starting a second one. A running job's worker sends a heartbeat every few
+seconds; jobs without one for stale_after seconds are re-queued, up to
+max_attempts runs in total. Groq API keys of in-app submissions are handed to
+the workers in memory (WorkerPool.keys), never written to the queue; such jobs
+are owned by the submitting pool and only its workers claim them (external
+workers take unowned jobs only). Queued jobs of a pool that has stopped are failed.
+"""
+import argparse, json, multiprocessing, os, signal, socket, sqlite3, sys, threading, time, traceback, uuid
+
+import modules
+from modules import (CACHE_DIR, PIPELINE_STAGES, ArtifactStore, CIREstimator, LLMBackend, LLMUCREvaluator,
+                     RAGResearchProcessorLLM, key_fingerprint, run_analysis, shared_resource, sqlite_execute)
+import telemetry
+
+WORKERS = int(os.getenv("PAPER_JOB_WORKERS", os.cpu_count() or 1))
+
+class JobQueue:
+    def __init__(self, path=None, stale_after=120, max_attempts=3):
+        self.path = path or os.path.join(CACHE_DIR, "jobs.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.stale_after, self.max_attempts = stale_after, max_attempts
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, url TEXT NOT NULL, options TEXT, status TEXT NOT NULL, stage TEXT,
+            progress TEXT, result TEXT, error TEXT, worker TEXT, attempts INTEGER DEFAULT 0,
+            created REAL, started REAL, finished REAL, heartbeat REAL, owner TEXT)""")
+        # at most one in-flight job per URL and options: a duplicate insert is ignored and joins the existing one
+        self._execute("DROP INDEX IF EXISTS jobs_in_flight")  # the URL-only index of the first schema
+        self._execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_in_flight_options ON jobs (url, options) "
+                      "WHERE status IN ('queued', 'running')")
+        self._execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created)")
+        self._execute("CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, seen REAL, owner TEXT)")
+        for table in ("jobs", "workers"):  # queues created before jobs had owners
+            if "owner" not in {row[1] for row in self._execute(f"PRAGMA table_info({table})")}:
+                try:
+                    self._execute(f"ALTER TABLE {table} ADD COLUMN owner TEXT")
+                except sqlite3.OperationalError:  # another process added it first
+                    pass
+
+    def _execute(self, sql, args=()):
+        return sqlite_execute(self.path, sql, args)
+
+    def submit(self, url, options=None, job_id=None, owner=None):
+        """Queue url and return the job id; returns the in-flight job's id if url is already queued/running
+        with the same options. A job with an owner is only claimed by that owner's workers."""
+        options = json.dumps(options or {}, sort_keys=True)
+        progress = json.dumps({s: "pending" for s in PIPELINE_STAGES})
+        self._execute("INSERT OR IGNORE INTO jobs (id, url, options, status, progress, created, owner) "
+                      "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                      (job_id or uuid.uuid4().hex[:16], url, options, progress, time.time(), owner))
+        rows = self._execute("SELECT id FROM jobs WHERE url = ? AND options = ? "
+                             "ORDER BY status IN ('queued', 'running') DESC, created DESC LIMIT 1", (url, options))
+        return rows[0][0]
+
+    def claim(self, worker, owner=None):
+        """Atomically move the oldest queued job of owner (or unowned) to running; returns (id, url, options)
+        or None."""
+        now = time.time()
+        rows = self._execute("UPDATE jobs SET status = 'running', worker = ?, started = ?, heartbeat = ?, "
+                             "attempts = attempts + 1 WHERE id = (SELECT id FROM jobs WHERE status = 'queued' "
+                             "AND (owner IS NULL OR owner = ?) ORDER BY created LIMIT 1) "
+                             "RETURNING id, url, options", (worker, now, now, owner))
+        return (rows[0][0], rows[0][1], json.loads(rows[0][2] or "{}")) if rows else None
+
+    def progress(self, job_id, stage, state):
+        self._execute("UPDATE jobs SET stage = ?, progress = json_set(progress, ?, ?), heartbeat = ? WHERE id = ?",
+                      (stage, f"$.{stage}", state, time.time(), job_id))
+
+    def heartbeat(self, worker, job_id=None, owner=None):
+        """Mark worker (of owner's pool, if any) alive, and its running job, if any."""
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO workers (name, seen, owner) VALUES (?, ?, ?)", (worker, now, owner))
+        if job_id:
+            self._execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'", (now, job_id))
+
+    def live_workers(self, within=30):
+        """Number of workers seen in the last within seconds."""
+        return self._execute("SELECT count(*) FROM workers WHERE seen > ?", (time.time() - within,))[0][0]
+
+    def finish(self, job_id, result):
+        self._execute("UPDATE jobs SET status = 'done', result = ?, finished = ? WHERE id = ?",
+                      (json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        self._execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                      (json.dumps(error), time.time(), job_id))
+
+    def requeue_stale(self):
+        """Put running jobs whose worker stopped sending heartbeats back in the queue, or fail them once
+        they have been tried max_attempts times (e.g. a paper that crashes its worker). Queued jobs whose
+        owning pool has had no live worker for stale_after seconds are failed: nothing else may run them."""
+        now, cutoff = time.time(), time.time() - self.stale_after
+        error = json.dumps({"type": "WorkerLost", "message": f"the worker stopped responding "
+                                                             f"{self.max_attempts} times"})
+        self._execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE status = 'running' "
+                      "AND heartbeat < ? AND attempts >= ?", (error, now, cutoff, self.max_attempts))
+        error = json.dumps({"type": "OwnerLost", "message": "the worker pool that owns this job has stopped"})
+        self._execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE status = 'queued' "
+                      "AND owner IS NOT NULL AND created < ? AND owner NOT IN "
+                      "(SELECT owner FROM workers WHERE seen >= ? AND owner IS NOT NULL)", (error, now, cutoff, cutoff))
+        return self._execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' "
+                             "AND heartbeat < ? RETURNING id", (cutoff,))
+
+    def in_flight(self, job_ids):
+        """The subset of job_ids that are queued or running."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        rows = self._execute(f"SELECT id FROM jobs WHERE status IN ('queued', 'running') AND id IN "
+                             f"({','.join('?' * len(job_ids))})", job_ids)
+        return {r[0] for r in rows}
+
+    def get(self, job_id):
+        rows = self._execute("SELECT id, url, options, status, stage, progress, result, error, worker, attempts, "
+                             "created, started, finished, owner FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        keys = ("id", "url", "options", "status", "stage", "progress", "result", "error", "worker", "attempts",
+                "created", "started", "finished", "owner")
+        job = dict(zip(keys, rows[0]))
+        for k in ("options", "progress", "result", "error"):
+            job[k] = json.loads(job[k]) if job[k] else None
+        return job
+
+# ---- workers ----
+def _parent_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+def _beat(queue, worker, job_id, stop, interval, owner):
+    while not stop.wait(interval):
+        try:
+            queue.heartbeat(worker, job_id, owner)
+        except Exception:  # a locked database must not kill the job; the next beat retries
+            pass
+
+def worker_loop(path=None, poll_interval=0.5, parent_pid=None, keys=None, page_workers=None, owner=None):
+    """Claim and run owner's jobs and unowned ones until the parent process (if given) exits.
+
+    Each job runs with the API key its submitter registered in keys (by job id), else $GROQ_API_KEY.
+    page_workers sizes this worker's PDF page pool unless PAPER_EXTRACT_WORKERS is set.
+    """
+    if page_workers and "PAPER_EXTRACT_WORKERS" not in os.environ:
+        modules.PAGE_WORKERS = page_workers
+    queue = JobQueue(path)
+    store = ArtifactStore()
+    pipelines = {}  # per API key, so retrieval indexes are reused across jobs
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    interval, last_beat = min(15.0, queue.stale_after / 8), 0.0
+    while parent_pid is None or _parent_alive(parent_pid):
+        if time.monotonic() - last_beat > interval:
+            queue.heartbeat(worker, owner=owner)
+            last_beat = time.monotonic()
+        job = queue.claim(worker, owner)
+        if job is None:
+            queue.requeue_stale()
+            time.sleep(poll_interval)
+            continue
+        job_id, url, options = job
+        stop = threading.Event()
+        threading.Thread(target=_beat, args=(queue, worker, job_id, stop, interval, owner),
+                         daemon=True).start()
+        try:
+            api_key = (keys.get(job_id) if keys is not None else None) or os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("Missing GROQ_API_KEY")
+            fingerprint = key_fingerprint(api_key)
+            if fingerprint not in pipelines:
+                llm = LLMBackend(api_key=api_key)
+                proc = RAGResearchProcessorLLM(llm)
+                pipelines[fingerprint] = proc, CIREstimator(llm), LLMUCREvaluator(llm, retriever=proc)
+            proc, cir, ucr = pipelines[fingerprint]
+            with telemetry.trace() as trace:
+                res = run_analysis(url, proc, cir, ucr, store, options.get("claims", ""),
+                                   on_stage=lambda stage, state: queue.progress(job_id, stage, state))
+            queue.finish(job_id, {"sha256": res["sha256"], "keys": res["keys"], "cached": res["cached"],
+                                  "analysis": res["analysis"], "cir": res["cir"], "ucr": res["ucr"],
+                                  "trace": trace.to_dict()})
+        except Exception as e:
+            queue.fail(job_id, {"type": type(e).__name__, "message": str(e),
+                                "traceback": traceback.format_exc(limit=5, chain=False)})
+        finally:
+            stop.set()
+            last_beat = 0.0
+            if keys is not None:
+                keys.pop(job_id, None)
+
+def start_workers(n=WORKERS, path=None, parent_pid=None, keys=None, owner=None):
+    """Start n worker processes (spawned, so safe from threaded parents like Streamlit).
+
+    Unless PAPER_EXTRACT_WORKERS says otherwise, the CPUs are split between the workers'
+    page pools instead of each worker starting one process per CPU.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    page_workers = max(1, (os.cpu_count() or 1) // max(n, 1))
+    workers = [ctx.Process(target=worker_loop, args=(path, 0.5, parent_pid or os.getpid(), keys, page_workers, owner),
+                           daemon=True, name=f"paper-worker-{i}") for i in range(n)]
+    for w in workers:
+        w.start()
+    return workers
+
+class WorkerPool:
+    """Worker processes owned by this process, plus the in-memory registry of API keys by job id.
+
+    The registry lives in a multiprocessing manager, so keys reach the workers without
+    touching SQLite, and every job runs on the key of whoever submitted it. Jobs submitted
+    here are owned by the pool (its id), so workers of other processes never claim them.
+    """
+    def __init__(self, n=WORKERS, path=None):
+        self.n, self.path = n, path
+        self.id = uuid.uuid4().hex[:16]
+        self.keys = multiprocessing.get_context("spawn").Manager().dict() if n > 0 else None
+        self.workers = []
+        self._lock = threading.Lock()
+        self.ensure_alive()
+
+    def ensure_alive(self):
+        """Replace workers that died (OOM, segfault) and drop keys of finished jobs; returns how many
+        workers are running."""
+        with self._lock:
+            self.workers = [w for w in self.workers if w.is_alive()]
+            if len(self.workers) < self.n:
+                self.workers += start_workers(self.n - len(self.workers), self.path, keys=self.keys, owner=self.id)
+            self._prune_keys()
+            return len(self.workers)
+
+    def _prune_keys(self):
+        """Drop keys of jobs no longer queued or running, e.g. failed by requeue_stale after a worker died
+        holding them; a worker pops its own job's key otherwise."""
+        if self.keys:
+            ids = list(self.keys.keys())
+            for job_id in set(ids) - JobQueue(self.path).in_flight(ids):
+                self.keys.pop(job_id, None)
+
+    def submit(self, queue, url, options=None, api_key=None):
+        """queue.submit with api_key registered for the job; a joined in-flight job keeps its own key."""
+        if self.keys is None:
+            return queue.submit(url, options)
+        if not api_key:
+            return queue.submit(url, options, owner=self.id)
+        job_id = uuid.uuid4().hex[:16]
+        with self._lock:  # not pruned between registering the key and inserting the row
+            self.keys[job_id] = api_key  # before the row exists, so no worker can claim the job without it
+            actual = queue.submit(url, options, job_id=job_id, owner=self.id)
+            if actual != job_id:
+                self.keys.pop(job_id, None)
+        return actual
+
+def ensure_workers(n=WORKERS, path=None):
+    """This process's WorkerPool (started on first call, dead workers replaced); n=0 means external workers."""
+    pool = shared_resource(("job_workers", path), lambda: WorkerPool(n, path))
+    pool.ensure_alive()
+    return pool
+
+def wait(queue, job_id, on_update=None, poll_interval=0.5, timeout=None, worker_grace=None):
+    """Poll until the job is done or failed, calling on_update(job) whenever its progress changes.
+
+    Returns the job unfinished when timeout passes, or when worker_grace seconds go by with no
+    live worker (none started, or all dead). Stale jobs are re-queued while waiting.
+    """
+    start = time.monotonic()
+    last = None
+    while True:
+        job = queue.get(job_id)
+        seen = (job["status"], job["progress"]) if job else None
+        if on_update and job and seen != last:
+            on_update(job)
+        last = seen
+        if job is None or job["status"] in ("done", "failed"):
+            return job
+        elapsed = time.monotonic() - start
+        if timeout and elapsed > timeout:
+            return job
+        if worker_grace and elapsed > worker_grace and not queue.live_workers(within=worker_grace):
+            return job
+        queue.requeue_stale()
+        time.sleep(poll_interval)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("command", nargs="?", default="work", choices=["work", "submit", "status"])
+    ap.add_argument("arg", nargs="?", help="URL for submit, job id for status")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--queue", help="SQLite path (defaults to <cache>/jobs.sqlite)")
+    args = ap.parse_args(argv)
+    queue = JobQueue(args.queue)
+    if args.command == "submit":
+        print(queue.submit(args.arg))
+        return 0
+    if args.command == "status":
+        print(json.dumps(queue.get(args.arg), indent=2))
+        return 0
+    workers = start_workers(args.workers, args.queue)  # jobs run on $GROQ_API_KEY
+    print(f"{len(workers)} workers on {queue.path}", file=sys.stderr)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *a: stop.set())
+    try:
+        while not stop.wait(1.0) and any(w.is_alive() for w in workers):
+            pass
+    except KeyboardInterrupt:
+        pass
+    for w in workers:
+        w.terminate()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
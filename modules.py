@@ -1,144 +1,2017 @@
-import os, io, re, json, requests, pdfplumber, math
+import os, io, re, json, requests, math, hashlib, time, threading, sqlite3, asyncio, random, weakref, multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email.utils import parsedate_to_datetime
 from typing import List, Dict, Any
-from groq import Groq
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
+from telemetry import METRICS, span, dependency, record_dependency, in_context
+
+CACHE_DIR = os.getenv("PAPER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "paper_analyzer"))
+
+def sqlite_execute(path, sql, args=()):
+    """Run one statement on a short-lived connection (safe across threads and processes)."""
+    db = sqlite3.connect(path, timeout=30)
+    try:
+        with db:
+            return db.execute(sql, args).fetchall()
+    finally:
+        db.close()
+
+# ====== SHARED RESOURCES ======
+# Models and API clients are loaded once per process and shared by every
+# Streamlit session and worker thread. Their heavy imports (torch via
+# sentence-transformers, groq/httpx, the PDF parsers) are deferred to first use so
+# importing this module stays cheap.
+_RESOURCES = {}
+_RESOURCE_LOCKS = {}
+_RESOURCES_LOCK = threading.Lock()
+
+def shared_resource(key, factory):
+    """Return the process-wide object for key, calling factory() the first time only."""
+    if key in _RESOURCES:
+        return _RESOURCES[key]
+    with _RESOURCES_LOCK:
+        lock = _RESOURCE_LOCKS.setdefault(key, threading.Lock())
+    with lock:  # per key: a slow model load doesn't block other resources
+        if key not in _RESOURCES:
+            _RESOURCES[key] = factory()
+        return _RESOURCES[key]
+
+def shared_embedder(name="all-MiniLM-L6-v2"):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        with dependency("embedder_load", model=name):
+            return SentenceTransformer(name)
+    return shared_resource(("embedder", name), load)
+
+def shared_cross_encoder(name):
+    def load():
+        from sentence_transformers import CrossEncoder
+        with dependency("cross_encoder_load", model=name):
+            return CrossEncoder(name, device="cpu")
+    return shared_resource(("cross_encoder", name), load)
+
+def key_fingerprint(api_key):
+    """Stable id for an API key, for keying shared state without holding the key itself."""
+    return hashlib.sha256(api_key.encode()).hexdigest() if api_key else None
+
+def shared_groq_client(api_key, base_url=None):
+    def build():
+        from groq import Groq
+        return Groq(api_key=api_key, base_url=base_url, max_retries=0)  # LLMBackend retries via its scheduler
+    return shared_resource(("groq", key_fingerprint(api_key), base_url), build)
+
+def preload(embedder_name="all-MiniLM-L6-v2"):
+    """Start loading the embedder in a background thread (once per process); returns the thread."""
+    def start():
+        t = threading.Thread(target=shared_embedder, args=(embedder_name,), name="preload", daemon=True)
+        t.start()
+        return t
+    return shared_resource(("preload", embedder_name), start)
+
+# ====== LLM CACHE ======
+class LLMCache:
+    """SQLite-backed completion cache with TTL expiry and least-recently-used size eviction."""
+    def __init__(self, path=None, ttl=7 * 24 * 3600, max_entries=50000):
+        self.path = path or os.path.join(CACHE_DIR, "llm_cache.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.ttl, self.max_entries = ttl, max_entries
+        self.hits = self.misses = self.tokens_saved = 0
+        self.latency_saved = 0.0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL, accessed REAL,
+            prompt_tokens INTEGER, completion_tokens INTEGER, latency REAL)""")
+        self._execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _execute(self, sql, args=()):
+        return sqlite_execute(self.path, sql, args)
+
+    @staticmethod
+    def key(model, system, prompt, temperature):
+        return hashlib.sha256(json.dumps([model, system, prompt, temperature]).encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        rows = self._execute("SELECT response, prompt_tokens, completion_tokens, latency FROM responses "
+                             "WHERE key = ? AND created > ?", (key, now - self.ttl))
+        METRICS.inc("cache_requests_total", cache="llm", result="hit" if rows else "miss")
+        with self._lock:
+            if not rows:
+                self.misses += 1
+                return None
+            response, pt, ct, latency = rows[0]
+            self.hits += 1
+            self.tokens_saved += (pt or 0) + (ct or 0)
+            self.latency_saved += latency or 0.0
+        self._execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return response
+
+    def put(self, key, response, prompt_tokens=0, completion_tokens=0, latency=0.0):
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (key, response, now, now, prompt_tokens, completion_tokens, latency))
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % 100 == 1
+        if evict:
+            self.evict()
+
+    def evict(self):
+        self._execute("DELETE FROM responses WHERE created <= ?", (time.time() - self.ttl,))
+        self._execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                      "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "tokens_saved": self.tokens_saved, "latency_saved_s": round(self.latency_saved, 3)}
+
+# ====== RATE LIMITING ======
+def estimate_tokens(text):
+    return len(text or "") // 4 + 1
+
+class TokenBucketScheduler:
+    """Shared requests/min and tokens/min budget with a cap on in-flight calls.
+
+    Buckets refill continuously; callers reserve an estimated token cost up front
+    and settle the difference with the real usage on release. A 429 pauses every
+    caller sharing the scheduler until the server's Retry-After has passed.
+    """
+    def __init__(self, rpm=30, tpm=12000, max_in_flight=8):
+        self.rpm, self.tpm, self.max_in_flight = rpm, tpm, max_in_flight
+        self._requests, self._tokens = float(rpm), float(tpm)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()  # shared across threads and event loops
+
+    def _refill(self, now):
+        dt, self._last = now - self._last, now
+        self._requests = min(self.rpm, self._requests + dt * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + dt * self.tpm / 60)
+
+    def _try_acquire(self, tokens):
+        """Reserve a slot and return 0, or return how long to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._in_flight >= self.max_in_flight:
+                return 0.01
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                self._in_flight += 1
+                return 0
+            return max((1 - self._requests) * 60 / self.rpm, (tokens - self._tokens) * 60 / self.tpm, 0.001)
+
+    async def acquire(self, tokens):
+        tokens = min(tokens, self.tpm)
+        while True:
+            wait = self._try_acquire(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def acquire_sync(self, tokens):
+        """acquire() for threads: blocks the calling thread instead of the event loop."""
+        tokens = min(tokens, self.tpm)
+        while True:
+            wait = self._try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(min(wait, 1.0))
+
+    def release(self, reserved, used=None):
+        with self._lock:
+            self._in_flight -= 1
+            if used is not None:
+                self._tokens = min(self.tpm, self._tokens + min(reserved, self.tpm) - used)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+_SCHEDULERS = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+def scheduler_for(model, api_key=None):
+    """Process-wide scheduler per API key and model, sized from GROQ_RPM / GROQ_TPM / GROQ_MAX_IN_FLIGHT.
+
+    Groq's limits are per key, so users with their own keys don't throttle (or pause) each other.
+    """
+    key = (key_fingerprint(api_key), model)
+    with _SCHEDULERS_LOCK:
+        if key not in _SCHEDULERS:
+            _SCHEDULERS[key] = TokenBucketScheduler(int(os.getenv("GROQ_RPM", 30)), int(os.getenv("GROQ_TPM", 12000)),
+                                                    int(os.getenv("GROQ_MAX_IN_FLIGHT", 8)))
+        return _SCHEDULERS[key]
+
+def _retry_after(exc):
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after-ms")) / 1000
+    except (TypeError, ValueError):
+        pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def retryable_errors():
+    import groq
+    return groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError
 
 # ====== LLM BACKEND ======
 class LLMBackend:
-    def __init__(self, api_key=None, model="llama-3.3-70b-versatile"):
+    COMPLETION_TOKENS_ESTIMATE = 512
+
+    def __init__(self, api_key=None, model="llama-3.3-70b-versatile", cache=None, cache_nonzero_temperature=False,
+                 base_url=None, scheduler=None):
         api_key = api_key or os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("Missing GROQ_API_KEY")
-        self.client = Groq(api_key=api_key)
+        self.api_key, self.base_url = api_key, base_url
+        self.client = shared_groq_client(api_key, base_url)
         self.model = model
+        # cache=None uses the shared on-disk cache, cache=False disables caching
+        self.cache = LLMCache() if cache is None else (cache or None)
+        self.cache_nonzero_temperature = cache_nonzero_temperature
+        self.scheduler = scheduler or scheduler_for(model, api_key)
+        self.call_metrics = deque(maxlen=1000)
+        self._aclients = weakref.WeakKeyDictionary()
+
+    def _count_call(self, source, usage=None):
+        METRICS.inc("llm_calls_total", model=self.model, source=source)
+        if usage is not None:
+            METRICS.inc("llm_prompt_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, model=self.model)
+            METRICS.inc("llm_completion_tokens_total", getattr(usage, "completion_tokens", 0) or 0, model=self.model)
+
+    def _use_cache(self, temperature, cache):
+        if self.cache is None:
+            return False
+        return cache if cache is not None else (temperature == 0 or self.cache_nonzero_temperature)
+
+    def _backoff(self, e, attempt, backoff_base, backoff_cap):
+        """Seconds to wait before retrying after e; a 429 also pauses every caller of the scheduler."""
+        METRICS.inc("llm_retries_total", model=self.model, error=type(e).__name__)
+        delay = _retry_after(e)
+        if delay is None:
+            delay = min(backoff_cap, backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if isinstance(e, retryable_errors()[0]):  # RateLimitError
+            self.scheduler.pause(delay)
+        return delay
+
+    def chat(self, prompt, system=None, temperature=0.2, cache=None, max_retries=5, backoff_base=1.0,
+             backoff_cap=30.0, accept=None):
+        """Blocking chat through the shared rate-limit scheduler, so concurrent callers stay within
+        the rpm/tpm budget; retries 429/5xx/connection errors.
+
+        cache=True/False overrides the default of caching only temperature-0 calls. Replies
+        failing accept(text) are neither cached nor served from the cache.
+        """
+        use_cache = self._use_cache(temperature, cache)
+        if use_cache:
+            key = LLMCache.key(self.model, system, prompt, temperature)
+            hit = self.cache.get(key)
+            if hit is not None and (accept is None or accept(hit)):
+                self._count_call("cache")
+                return hit
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+        reserved = estimate_tokens(system) + estimate_tokens(prompt) + self.COMPLETION_TOKENS_ESTIMATE
+        for attempt in range(max_retries + 1):
+            self.scheduler.acquire_sync(reserved)
+            used = None
+            t0 = time.perf_counter()
+            try:
+                with dependency("groq", model=self.model, attempt=attempt + 1):
+                    resp = self.client.chat.completions.create(
+                        model=self.model, messages=messages, temperature=temperature
+                    )
+                used = getattr(getattr(resp, "usage", None), "total_tokens", None)
+                break
+            except retryable_errors() as e:
+                if attempt == max_retries:
+                    METRICS.inc("llm_retries_total", model=self.model, error=type(e).__name__)
+                    raise
+                delay = self._backoff(e, attempt, backoff_base, backoff_cap)
+            finally:
+                self.scheduler.release(reserved, used)
+            time.sleep(delay)
+        latency = time.perf_counter() - t0
+        text = resp.choices[0].message.content.strip()
+        usage = getattr(resp, "usage", None)
+        self._count_call("api", usage)
+        self.call_metrics.append({"latency_s": latency, "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                                  "completion_tokens": getattr(usage, "completion_tokens", 0)})
+        if use_cache and (accept is None or accept(text)):
+            self.cache.put(key, text, getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0),
+                           latency)
+        return text
+
+    def stream(self, prompt, system=None, temperature=0.2, cache=None, max_retries=2):
+        """Yield completion text deltas as they arrive; records time-to-first-token in call_metrics."""
+        use_cache = self._use_cache(temperature, cache)
+        if use_cache:
+            key = LLMCache.key(self.model, system, prompt, temperature)
+            hit = self.cache.get(key)
+            if hit is not None:
+                self._count_call("cache")
+                yield hit
+                return
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+        reserved = estimate_tokens(system) + estimate_tokens(prompt) + self.COMPLETION_TOKENS_ESTIMATE
+        ttft, parts, usage = None, [], None
+        for attempt in range(max_retries + 1):
+            self.scheduler.acquire_sync(reserved)
+            t0 = time.perf_counter()
+            try:
+                chunks = self.client.chat.completions.create(
+                    model=self.model, messages=messages, temperature=temperature, stream=True
+                )
+                break
+            except retryable_errors() as e:
+                self.scheduler.release(reserved)
+                if attempt == max_retries:
+                    METRICS.inc("llm_retries_total", model=self.model, error=type(e).__name__)
+                    raise
+                time.sleep(self._backoff(e, attempt, 1.0, 30.0))
+            except BaseException:
+                self.scheduler.release(reserved)
+                raise
+        try:
+            for chunk in chunks:
+                # Groq reports usage on the final chunk under x_groq
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                parts.append(delta)
+                yield delta
+        finally:
+            self.scheduler.release(reserved, getattr(usage, "total_tokens", None))
+        latency = time.perf_counter() - t0
+        record_dependency("groq", t0, latency, model=self.model, ttft_s=ttft)
+        METRICS.observe("llm_time_to_first_token_seconds", ttft if ttft is not None else latency, model=self.model)
+        self._count_call("api", usage)
+        self.call_metrics.append({"latency_s": latency, "ttft_s": ttft if ttft is not None else latency,
+                                  "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                                  "completion_tokens": getattr(usage, "completion_tokens", 0), "stream": True})
+        if use_cache:
+            self.cache.put(key, "".join(parts).strip(), getattr(usage, "prompt_tokens", 0),
+                           getattr(usage, "completion_tokens", 0), latency)
+
+    def _aclient(self):
+        # httpx async connection pools are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None:
+            from groq import AsyncGroq
+            client = self._aclients[loop] = AsyncGroq(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return client
 
-    def chat(self, prompt, system=None, temperature=0.2):
+    async def achat(self, prompt, system=None, temperature=0.2, cache=None, max_retries=5,
+                    backoff_base=1.0, backoff_cap=30.0):
+        """Async chat through the shared rate-limit scheduler, retrying 429/5xx/connection errors."""
+        use_cache = self._use_cache(temperature, cache)
+        if use_cache:
+            key = LLMCache.key(self.model, system, prompt, temperature)
+            hit = await asyncio.to_thread(self.cache.get, key)
+            if hit is not None:
+                self._count_call("cache")
+                return hit
         messages = []
         if system:
             messages.append({"role": "system", "content": system})
         messages.append({"role": "user", "content": prompt})
-        resp = self.client.chat.completions.create(
-            model=self.model, messages=messages, temperature=temperature
-        )
-        return resp.choices[0].message.content.strip()
+        reserved = estimate_tokens(system) + estimate_tokens(prompt) + self.COMPLETION_TOKENS_ESTIMATE
+        t_start = time.perf_counter()
+        for attempt in range(max_retries + 1):
+            await self.scheduler.acquire(reserved)
+            used = None
+            t0 = time.perf_counter()
+            try:
+                with dependency("groq", model=self.model, attempt=attempt + 1):
+                    resp = await self._aclient().chat.completions.create(
+                        model=self.model, messages=messages, temperature=temperature
+                    )
+                used = getattr(getattr(resp, "usage", None), "total_tokens", None)
+            except retryable_errors() as e:
+                if attempt == max_retries:
+                    METRICS.inc("llm_retries_total", model=self.model, error=type(e).__name__)
+                    raise
+                await asyncio.sleep(self._backoff(e, attempt, backoff_base, backoff_cap))
+                continue
+            finally:
+                self.scheduler.release(reserved, used)
+            latency = time.perf_counter() - t0
+            usage = resp.usage
+            text = resp.choices[0].message.content.strip()
+            self._count_call("api", usage)
+            self.call_metrics.append({"latency_s": latency, "total_s": time.perf_counter() - t_start,
+                                      "attempts": attempt + 1, "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                                      "completion_tokens": getattr(usage, "completion_tokens", 0)})
+            if use_cache:
+                await asyncio.to_thread(self.cache.put, key, text, getattr(usage, "prompt_tokens", 0),
+                                        getattr(usage, "completion_tokens", 0), latency)
+            return text
+
+# ====== CHUNKING ======
+_SENTENCE_RE = re.compile(r"\S.*?(?:[.!?]+(?=\s)|$)", re.S)
+_WORD_RE = re.compile(r"\S+")
+
+class ChunkStore:
+    """Chunks kept as character offsets into one text arena, with page numbers in NumPy arrays.
+
+    The arena is the document text (pages joined by "\\n", as extract_document_text
+    returns it), so overlapping chunks cost no extra memory and every chunk maps
+    back to its exact position. Indexing and iteration yield the familiar
+    {"page", "content"} dicts, plus "start"/"end" offsets.
+    """
+    def __init__(self, text, starts, ends, pages, page_numbers=(), page_offsets=()):
+        self.text = text
+        self.starts = np.asarray(starts, np.int64)
+        self.ends = np.asarray(ends, np.int64)
+        self.pages = np.asarray(pages, np.int32)
+        self.page_numbers = np.asarray(page_numbers, np.int32)
+        self.page_offsets = np.asarray(page_offsets, np.int64)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        s, e = int(self.starts[i]), int(self.ends[i])
+        return {"page": int(self.pages[i]), "content": self.text[s:e], "start": s, "end": e}
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def texts(self):
+        return [self.text[s:e] for s, e in zip(self.starts.tolist(), self.ends.tolist())]
+
+    def to_dicts(self):
+        return list(self)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, text=np.frombuffer(self.text.encode("utf-8", "surrogatepass"), np.uint8),
+                     starts=self.starts, ends=self.ends, pages=self.pages,
+                     page_numbers=self.page_numbers, page_offsets=self.page_offsets)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z["text"].tobytes().decode("utf-8", "surrogatepass"), z["starts"], z["ends"], z["pages"],
+                       z["page_numbers"], z["page_offsets"])
+
+    @property
+    def nbytes(self):
+        arrays = (self.starts, self.ends, self.pages, self.page_numbers, self.page_offsets)
+        return len(self.text.encode()) + sum(a.nbytes for a in arrays)
+
+    @classmethod
+    def from_pages(cls, pages, count_tokens, max_tokens=254, overlap=32):
+        """Pack sentences from an iterable of {"page_number", "content"} dicts into chunks of at most
+        max_tokens, consuming it page by page. Consecutive chunks share up to overlap tokens of whole
+        sentences and may span a page break; a sentence longer than max_tokens is split at words.
+        count_tokens maps a list of strings to their token counts."""
+        parts, page_numbers, page_offsets = [], [], []
+        starts, ends, chunk_pages = [], [], []
+        window, size, fresh = deque(), 0, False  # units (start, end, tokens, page) of the open chunk
+        offset = 0
+        for p in pages:
+            text, number = p["content"], p["page_number"]
+            page_numbers.append(number)
+            page_offsets.append(offset)
+            spans = [m.span() for m in _SENTENCE_RE.finditer(text)]
+            for (a, b), n in zip(spans, count_tokens([text[a:b] for a, b in spans]) if spans else []):
+                units = [(a, b, n)]
+                if n > max_tokens:
+                    words = [m.span() for m in _WORD_RE.finditer(text, a, b)]
+                    units, piece = [], None
+                    for (wa, wb), wn in zip(words, count_tokens([text[wa:wb] for wa, wb in words])):
+                        if piece and piece[2] + wn > max_tokens:
+                            units.append(piece)
+                            piece = None
+                        piece = (piece[0], wb, piece[2] + wn) if piece else (wa, wb, wn)
+                    units.append(piece)
+                for ua, ub, un in units:
+                    if size + un > max_tokens:
+                        if fresh:
+                            starts.append(window[0][0])
+                            ends.append(window[-1][1])
+                            chunk_pages.append(window[0][3])
+                            fresh = False
+                            size -= window.popleft()[2]  # always advance by at least one unit
+                        while window and (size > overlap or size + un > max_tokens):
+                            size -= window.popleft()[2]
+                    window.append((offset + ua, offset + ub, un, number))
+                    size += un
+                    fresh = True
+            parts.append(text + "\n")
+            offset += len(text) + 1
+        if fresh:
+            starts.append(window[0][0])
+            ends.append(window[-1][1])
+            chunk_pages.append(window[0][3])
+        return cls("".join(parts), starts, ends, chunk_pages, page_numbers, page_offsets)
+
+# ====== CHUNK INDEX ======
+def chunk_texts(chunks):
+    """Plain text of each chunk; accepts a ChunkStore, dicts ("content"/"text") or strings."""
+    if isinstance(chunks, ChunkStore):
+        return chunks.texts()
+    texts = []
+    for c in chunks:
+        if isinstance(c, dict):
+            texts.append(c.get("content", c.get("text", str(c))))
+        else:
+            texts.append(str(c))
+    return texts
+
+def content_hash(texts, salt=""):
+    h = hashlib.sha256(salt.encode())
+    for t in texts:
+        h.update(t.encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _normalize(vecs):
+    vecs = np.asarray(vecs, dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=-1, keepdims=True)
+    return vecs / np.maximum(norms, 1e-12)
+
+# Storage precision of chunk embeddings: float32, float16 (half the bytes) or int8 (a quarter, one scale per row)
+EMBEDDING_DTYPE = os.getenv("PAPER_EMBEDDING_DTYPE", "float32")
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+def quantize(vecs, dtype):
+    """Return (codes, scales) for float32 rows; scales is None unless dtype is int8 (symmetric, per row)."""
+    vecs = np.asarray(vecs, dtype=np.float32)
+    if dtype == "int8":
+        scales = np.maximum(np.abs(vecs).max(axis=1, initial=0.0), 1e-12).astype(np.float32) / 127
+        return np.rint(vecs / scales[:, None]).astype(np.int8), scales
+    return vecs.astype(dtype), None
+
+class ChunkIndex:
+    """L2-normalized chunk embeddings; a query is one mat-vec plus a partial sort.
+
+    Vectors may be stored as float16 or int8 codes (see quantize); they are scored
+    in blocks without ever materializing a float32 copy of the matrix, so an index
+    memory-mapped from disk stays shared between sessions through the page cache.
+    """
+    BLOCK_ROWS = 8192
+
+    def __init__(self, vectors, key=None, scales=None):
+        self.vectors = vectors
+        self.key = key
+        self.scales = scales
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @staticmethod
+    def _paths(cache_dir, key, dtype):
+        base = os.path.join(cache_dir, "index", key if dtype == "float32" else f"{key}.{dtype}")
+        return base + ".npy", base + ".scales.npy"
+
+    @classmethod
+    def load_or_build(cls, embedder, texts, key, cache_dir=CACHE_DIR, dtype="float32"):
+        path, scales_path = cls._paths(cache_dir, key, dtype) if cache_dir else (None, None)
+        if path and os.path.exists(path):
+            try:
+                scales = np.load(scales_path, mmap_mode="r") if dtype == "int8" else None
+                return cls(np.load(path, mmap_mode="r"), key, scales)
+            except (OSError, ValueError):
+                pass  # truncated/corrupt file: rebuild below
+        if not texts:
+            return cls(np.zeros((0, 0), dtype=dtype), key, np.zeros(0, np.float32) if dtype == "int8" else None)
+        with dependency("embedder", texts=len(texts)):
+            vecs, scales = quantize(_normalize(embedder.encode(texts, batch_size=64)), dtype)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # scales first: the codes file appearing is what marks the index complete
+            for target, arr in ((scales_path, scales), (path, vecs)):
+                if arr is None:
+                    continue
+                tmp = f"{target}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    np.save(f, arr)
+                os.replace(tmp, target)
+            vecs = np.load(path, mmap_mode="r")
+            scales = np.load(scales_path, mmap_mode="r") if scales is not None else None
+        return cls(vecs, key, scales)
+
+    def scores(self, q_vec):
+        """Cosine similarity of every row with the (normalized) float32 query."""
+        q = np.asarray(q_vec, dtype=np.float32)
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ q
+        sims = np.empty(len(self), dtype=np.float32)
+        for i in range(0, len(self), self.BLOCK_ROWS):
+            sims[i:i + self.BLOCK_ROWS] = self.vectors[i:i + self.BLOCK_ROWS].astype(np.float32) @ q
+        if self.scales is not None:
+            sims *= self.scales
+        return sims
+
+    def dequantized(self):
+        """The rows as a float32 array (for consumers that need raw vectors, e.g. the VectorStore)."""
+        vecs = np.asarray(self.vectors, dtype=np.float32)
+        return vecs * self.scales[:, None] if self.scales is not None else vecs
+
+    def search(self, q_vec, top_k=3):
+        """Return (indices, scores) of the top_k rows by cosine similarity."""
+        n = len(self)
+        if n == 0 or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        sims = self.scores(q_vec)
+        k = min(top_k, n)
+        idx = np.argpartition(-sims, k - 1)[:k]
+        idx = idx[np.argsort(-sims[idx], kind="stable")]
+        return idx, sims[idx]
+
+# ====== LEXICAL INDEX ======
+_TERM_RE = re.compile(r"\w+")
+
+def lexical_terms(text):
+    return _TERM_RE.findall(text.lower())
+
+class BM25Index:
+    """Okapi BM25 over chunk texts: a sparse (terms x chunks) matrix of precomputed term weights,
+    so a query is a sum of the rows of its terms. Never touches the embedder."""
+    def __init__(self, texts, k1=1.5, b=0.75):
+        from scipy import sparse
+        self.vocab, rows, cols = {}, [], []
+        lengths = np.zeros(len(texts), np.float32)
+        for j, text in enumerate(texts):
+            terms = lexical_terms(text)
+            lengths[j] = len(terms)
+            rows.extend(self.vocab.setdefault(t, len(self.vocab)) for t in terms)
+            cols.extend([j] * len(terms))
+        tf = sparse.csr_matrix((np.ones(len(rows), np.float32), (rows, cols)), shape=(len(self.vocab), len(texts)))
+        tf.sum_duplicates()
+        df = np.diff(tf.indptr)
+        idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()) if len(texts) else 0.0, 1.0))
+        tf.data = np.repeat(idf, df) * tf.data * (k1 + 1) / (tf.data + norm[tf.indices])
+        self.weights = tf
+
+    def __len__(self):
+        return self.weights.shape[1]
+
+    def search(self, query, top_k=3):
+        """Return (indices, scores) of the top_k chunks with a positive BM25 score."""
+        ids = sorted({self.vocab[t] for t in lexical_terms(query) if t in self.vocab})
+        if not ids or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = np.asarray(self.weights[ids].sum(axis=0)).ravel()
+        hits = np.flatnonzero(scores > 0)
+        k = min(top_k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top, scores[top]
+
+def reciprocal_rank_fusion(rankings, top_k=3, k=60):
+    """Fuse ranked index arrays by sum of 1 / (k + rank); returns (indices, fused scores)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, i in enumerate(np.asarray(ranking).tolist()):
+            fused[i] = fused.get(i, 0.0) + 1.0 / (k + rank + 1)
+    best = sorted(fused.items(), key=lambda kv: -kv[1])[:top_k]
+    return (np.array([i for i, _ in best], dtype=np.int64), np.array([s for _, s in best], dtype=np.float32))
+
+# ====== PROMPT BUDGET ======
+# Estimated prompt tokens per LLM call site, overridable with PAPER_PROMPT_BUDGET_<SITE>.
+# None means the site is only measured: analysis windows are already sized by section_windows.
+PROMPT_BUDGETS = {"chat": 700, "ucr": 4000, "novelty": 600, "analysis": None, "analysis_merge": None}
+PROMPT_MMR = float(os.getenv("PAPER_PROMPT_MMR")) if os.getenv("PAPER_PROMPT_MMR") else None
+
+def prompt_budget(site):
+    value = os.getenv(f"PAPER_PROMPT_BUDGET_{site.upper()}")
+    return int(value) if value else PROMPT_BUDGETS.get(site)
+
+def mmr_order(passages, scores, lam=0.7):
+    """Maximal marginal relevance: min-max normalized score against word overlap with passages already picked."""
+    lo, hi = min(scores, default=0), max(scores, default=0)
+    relevance = [(s - lo) / (hi - lo) if hi > lo else 1.0 for s in scores]
+    bags = [set(lexical_terms(p)) for p in passages]
+    order, left = [], list(range(len(passages)))
+    while left:
+        def gain(i):
+            redundancy = max((len(bags[i] & bags[j]) / (len(bags[i] | bags[j]) or 1) for j in order), default=0.0)
+            return lam * relevance[i] - (1 - lam) * redundancy
+        best = max(left, key=gain)
+        order.append(best)
+        left.remove(best)
+    return order
+
+def _sentence_key(sentence):
+    return " ".join(sentence.lower().split())
+
+def sentence_keys(text):
+    """Normalized sentences of text, as pack_context compares them."""
+    return {_sentence_key(m.group()) for m in _SENTENCE_RE.finditer(text)}
+
+def pack_context(passages, budget=None, scores=None, mmr=None, count_tokens=estimate_tokens):
+    """Choose and order the context passages of one prompt; returns [(index, text)] in prompt order.
+
+    Passages go highest score first (input order if scores is None), or by MMR with
+    lambda=mmr. Sentences an earlier passage already contributed are dropped, which
+    removes chunk overlaps and repeated text, and passages are added until budget
+    tokens are used; the first one that does not fit is cut at a sentence boundary,
+    or at a word boundary if not even its first sentence fits.
+    """
+    if scores is None:
+        order = range(len(passages))
+    elif mmr is not None:
+        order = mmr_order(passages, scores, mmr)
+    else:
+        order = sorted(range(len(passages)), key=lambda i: -scores[i])
+    seen, packed, used = set(), [], 0
+    for i in order:
+        sentences = [m.group() for m in _SENTENCE_RE.finditer(passages[i])]
+        sentences = [t for t in sentences if _sentence_key(t) not in seen]
+        costs = [count_tokens(t) for t in sentences]
+        take = len(sentences)
+        if budget is not None:
+            while take and used + sum(costs[:take]) > budget:
+                take -= 1
+        if take:
+            seen.update(_sentence_key(t) for t in sentences[:take])
+            packed.append((i, " ".join(sentences[:take])))
+            used += sum(costs[:take])
+        elif sentences:
+            # e.g. an abstract without sentence breaks: its longest prefix of whole words that fits
+            cut = _fit_words(sentences[0], budget - used, count_tokens)
+            if cut:
+                packed.append((i, cut))
+        if take < len(sentences):
+            break
+    return packed
+
+def _fit_words(text, room, count_tokens):
+    """The longest prefix of text ending at a word boundary that costs at most room tokens."""
+    ends = [m.end() for m in _WORD_RE.finditer(text)]
+    lo, hi = 0, len(ends)  # binary search for the number of words
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:ends[mid - 1]]) <= room:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:ends[lo - 1]] if lo else ""
+
+def report_prompt(site, prompt, offered_tokens=0, context_tokens=0):
+    """Count one prompt's estimated tokens, and the context tokens dropped to fit its budget, per call site."""
+    tokens = estimate_tokens(prompt)
+    METRICS.inc("prompt_calls_total", site=site)
+    METRICS.inc("prompt_tokens_total", tokens, site=site)
+    METRICS.inc("prompt_context_dropped_tokens_total", max(offered_tokens - context_tokens, 0), site=site)
+    return tokens
+
+def compile_prompt(site, template, passages=(), scores=None, mmr=None, budget=None, separator="\n\n", **fields):
+    """Fill template's {context} (and **fields) with the passages that fit the site's budget.
+
+    The budget covers the whole prompt: the template and fields are counted first and
+    the context gets what is left. Returns (prompt, indices of the passages used).
+    """
+    budget = budget if budget is not None else prompt_budget(site)
+    room = None if budget is None else max(budget - estimate_tokens(template.format(context="", **fields)), 0)
+    packed = pack_context(passages, room, scores, mmr)
+    context = separator.join(text for _, text in packed)
+    prompt = template.format(context=context, **fields)
+    report_prompt(site, prompt, sum(estimate_tokens(p) for p in passages), estimate_tokens(context))
+    return prompt, [i for i, _ in packed]
+
+# ====== DOCUMENT CACHE ======
+class DocumentCache:
+    """Content-addressed PDF store (by SHA-256) with per-page text, conditional revalidation and LRU eviction."""
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=2 * 1024**3, max_age=24 * 3600,
+                 session=None, timeout=(10, 60), chunk_size=1 << 16):
+        self.root = os.path.join(cache_dir, "docs")
+        os.makedirs(self.root, exist_ok=True)
+        self.index_path = os.path.join(self.root, "urls.json")
+        self.max_bytes, self.max_age = max_bytes, max_age
+        self.timeout, self.chunk_size = timeout, chunk_size
+        self.session = session or requests.Session()
+        self.hits = self.misses = self.revalidations = 0
+        self._lock = threading.Lock()
+
+    def pdf_path(self, sha):
+        return os.path.join(self.root, sha + ".pdf")
+
+    def pages_path(self, sha, backend=None):
+        backend = backend or PDF_BACKEND
+        # pdfplumber keeps the name page texts had before backends were selectable
+        return os.path.join(self.root, sha + (".pages.json" if backend == "pdfplumber" else f".{backend}.pages.json"))
+
+    def _files(self, sha):
+        return [self.pdf_path(sha)] + [self.pages_path(sha, b) for b in PDF_BACKENDS]
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.index_path)
+
+    def _touch(self, sha):
+        for p in self._files(sha):
+            if os.path.exists(p):
+                os.utime(p)
+
+    def fetch(self, url):
+        """Return (sha256, local_pdf_path) for url, downloading or revalidating only when needed."""
+        with self._lock:
+            index = self._read_index()
+        entry = index.get(url)
+        if entry and not os.path.exists(self.pdf_path(entry["sha"])):
+            entry = None
+        if entry and time.time() - entry.get("checked", 0) < self.max_age:
+            self.hits += 1
+            METRICS.inc("cache_requests_total", cache="document", result="hit")
+            self._touch(entry["sha"])
+            return entry["sha"], self.pdf_path(entry["sha"])
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        with dependency("pdf_download", conditional=bool(headers)) as attrs:
+            try:
+                r = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            except requests.RequestException:
+                if entry:  # offline: serve the stale copy rather than fail
+                    self.hits += 1
+                    METRICS.inc("cache_requests_total", cache="document", result="stale")
+                    return entry["sha"], self.pdf_path(entry["sha"])
+                raise
+            with r:
+                attrs["status"] = r.status_code
+                if r.status_code == 304 and entry:
+                    self.hits += 1
+                    self.revalidations += 1
+                    METRICS.inc("cache_requests_total", cache="document", result="revalidated")
+                    entry["checked"] = time.time()
+                    sha = entry["sha"]
+                else:
+                    r.raise_for_status()
+                    self.misses += 1
+                    METRICS.inc("cache_requests_total", cache="document", result="miss")
+                    sha = self._store_stream(r)
+                    entry = {"sha": sha, "etag": r.headers.get("ETag"),
+                             "last_modified": r.headers.get("Last-Modified"), "checked": time.time()}
+        with self._lock:
+            index = self._read_index()
+            index[url] = entry
+            self._write_index(index)
+        self._touch(sha)
+        self.evict()
+        return sha, self.pdf_path(sha)
+
+    def _store_stream(self, r):
+        h = hashlib.sha256()
+        tmp = os.path.join(self.root, f"download.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            for block in r.iter_content(self.chunk_size):
+                h.update(block)
+                f.write(block)
+        sha = h.hexdigest()
+        os.replace(tmp, self.pdf_path(sha))
+        return sha
+
+    def load_pages(self, sha, backend=None):
+        try:
+            with open(self.pages_path(sha, backend)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_pages(self, sha, texts, backend=None):
+        path = self.pages_path(sha, backend)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(texts, f)
+        os.replace(tmp, path)
+
+    def size(self):
+        return sum(e.stat().st_size for e in os.scandir(self.root) if e.name.endswith((".pdf", ".pages.json")))
+
+    def evict(self):
+        """Drop least-recently-used documents until the cache fits in max_bytes."""
+        docs = {}
+        for e in os.scandir(self.root):
+            if e.name.endswith(".pdf") or e.name.endswith(".pages.json"):
+                sha = e.name.split(".", 1)[0]
+                st = e.stat()
+                size, atime = docs.get(sha, (0, 0))
+                docs[sha] = (size + st.st_size, max(atime, st.st_mtime))
+        total = sum(size for size, _ in docs.values())
+        removed = set()
+        for sha, (size, _) in sorted(docs.items(), key=lambda kv: kv[1][1]):
+            if total <= self.max_bytes:
+                break
+            for p in self._files(sha):
+                if os.path.exists(p):
+                    os.remove(p)
+            total -= size
+            removed.add(sha)
+        if removed:
+            with self._lock:
+                index = {u: e for u, e in self._read_index().items() if e["sha"] not in removed}
+                self._write_index(index)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "revalidations": self.revalidations,
+                "hit_rate": self.hits / total if total else 0.0, "bytes": self.size()}
+
+# ====== ARTIFACT STORE ======
+class ArtifactStore:
+    """Shared, versioned memo of pipeline stage outputs keyed by (PDF hash, stage, config).
+
+    An index row per artifact lives in SQLite; payloads are files under
+    <root>/<pdf hash>/ (JSON, or .npz for a ChunkStore). A stage's config holds
+    its code version, its parameters and the keys of the artifacts it was
+    computed from, so changing any of them recomputes that stage and everything
+    downstream while the rest is reused. Safe across sessions, threads and
+    processes; concurrent requests for one artifact in a process compute it once.
+    """
+    def __init__(self, root=None):
+        self.root = root or os.path.join(CACHE_DIR, "artifacts")
+        os.makedirs(self.root, exist_ok=True)
+        self.path = os.path.join(self.root, "artifacts.sqlite")
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute("""CREATE TABLE IF NOT EXISTS artifacts (
+            pdf_hash TEXT, stage TEXT, key TEXT, config TEXT, file TEXT, bytes INTEGER, created REAL, accessed REAL,
+            PRIMARY KEY (pdf_hash, stage, key))""")
+
+    def _execute(self, sql, args=()):
+        return sqlite_execute(self.path, sql, args)
+
+    @staticmethod
+    def key(stage, config):
+        return hashlib.sha256(json.dumps([stage, config], sort_keys=True).encode()).hexdigest()[:32]
+
+    def get(self, pdf_hash, stage, key, max_age=None):
+        rows = self._execute("SELECT file, created FROM artifacts WHERE pdf_hash = ? AND stage = ? AND key = ?",
+                             (pdf_hash, stage, key))
+        value = None
+        if rows and (max_age is None or rows[0][1] > time.time() - max_age):
+            path = os.path.join(self.root, pdf_hash, rows[0][0])
+            try:
+                if path.endswith(".npz"):
+                    value = ChunkStore.load(path)
+                else:
+                    with open(path) as f:
+                        value = json.load(f)
+            except (OSError, ValueError):
+                value = None  # payload missing or torn: recompute
+        METRICS.inc("cache_requests_total", cache="artifact", stage=stage,
+                    result="hit" if value is not None else "miss")
+        if value is not None:
+            self._execute("UPDATE artifacts SET accessed = ? WHERE pdf_hash = ? AND stage = ? AND key = ?",
+                          (time.time(), pdf_hash, stage, key))
+        return value
+
+    def put(self, pdf_hash, stage, key, value, config=None):
+        folder = os.path.join(self.root, pdf_hash)
+        os.makedirs(folder, exist_ok=True)
+        name = f"{stage}-{key}" + (".npz" if isinstance(value, ChunkStore) else ".json")
+        tmp = os.path.join(folder, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        if isinstance(value, ChunkStore):
+            value.save(tmp)
+        else:
+            with open(tmp, "w") as f:
+                json.dump(value, f)
+        os.replace(tmp, os.path.join(folder, name))
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                      (pdf_hash, stage, key, json.dumps(config, sort_keys=True), name,
+                       os.path.getsize(os.path.join(folder, name)), now, now))
+
+    def memoize(self, pdf_hash, stage, config, compute, max_age=None, keep=None):
+        """Return (value, key, hit): the stored artifact for config, or compute() stored under it.
+
+        Only values passing keep(value) (default: not None or empty) are stored; a failed
+        result is returned but computed again next time.
+        """
+        key = self.key(stage, config)
+        with self._lock:
+            lock = self._locks.setdefault((pdf_hash, stage, key), threading.Lock())
+        with lock:
+            value = self.get(pdf_hash, stage, key, max_age)
+            if value is not None:
+                return value, key, True
+            value = compute()
+            if (keep or _non_empty)(value):
+                self.put(pdf_hash, stage, key, value, config)
+            else:
+                METRICS.inc("artifacts_not_stored_total", stage=stage)
+            return value, key, False
+
+    def stages(self, pdf_hash):
+        """Stored artifacts of one paper, newest first."""
+        rows = self._execute("SELECT stage, key, config, bytes, created FROM artifacts WHERE pdf_hash = ? "
+                             "ORDER BY created DESC", (pdf_hash,))
+        return [{"stage": s, "key": k, "config": json.loads(c), "bytes": b, "created": t} for s, k, c, b, t in rows]
+
+    def delete(self, pdf_hash, stage=None):
+        """Drop a paper's artifacts (or one stage's); returns how many were removed."""
+        rows = self._execute("SELECT stage, file FROM artifacts WHERE pdf_hash = ?", (pdf_hash,))
+        rows = [(s, f) for s, f in rows if stage is None or s == stage]
+        for s, name in rows:
+            try:
+                os.remove(os.path.join(self.root, pdf_hash, name))
+            except OSError:
+                pass
+            self._execute("DELETE FROM artifacts WHERE pdf_hash = ? AND stage = ? AND file = ?", (pdf_hash, s, name))
+        return len(rows)
+
+def _non_empty(value):
+    return value is not None and (not hasattr(value, "__len__") or len(value) > 0)
+
+# ====== PAGE EXTRACTION ======
+PAGE_WORKERS = int(os.getenv("PAPER_EXTRACT_WORKERS", os.cpu_count() or 1))
+PDF_BACKEND = os.getenv("PAPER_PDF_BACKEND", "pypdfium2")  # "pypdfium2", "pdfminer" or "pdfplumber"
+RETRIEVAL_MODE = os.getenv("PAPER_RETRIEVAL", "hybrid")  # "hybrid", "dense" or "lexical"
+_PAGE_POOL = None
+_PAGE_POOL_LOCK = threading.Lock()
+# unmapped glyphs: "(cid:N)" from pdfminer/pdfplumber, U+FFFD or control characters from pdfium
+_GARBLED_RE = re.compile(r"\(cid:\d+\)|[\ufffd\x00-\x08\x0b\x0e-\x1f]")
+
+def _page_pool():
+    global _PAGE_POOL
+    with _PAGE_POOL_LOCK:
+        if _PAGE_POOL is None:
+            # never fork: callers are multithreaded (job heartbeats, Streamlit, loaded torch)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _PAGE_POOL = ProcessPoolExecutor(max_workers=PAGE_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _PAGE_POOL
+
+def _reset_page_pool(pool):
+    """Drop pool (one of its workers died) so the next document gets a fresh one."""
+    global _PAGE_POOL
+    with _PAGE_POOL_LOCK:
+        if _PAGE_POOL is pool:
+            _PAGE_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _source(pdf_file):
+    """A path as is; PDF bytes as a fresh file object for parsers that want one."""
+    return io.BytesIO(pdf_file) if isinstance(pdf_file, bytes) else pdf_file
+
+def _pypdfium2_pages(pdf_file, indices):
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(pdf_file)
+    try:
+        texts = []
+        for i in indices:
+            page = pdf[i]
+            textpage = page.get_textpage()
+            text = textpage.get_text_range().replace("\r\n", "\n").replace("\r", "\n")
+            texts.append(text.replace("\ufffe", ""))  # U+FFFE marks a word hyphenated across lines
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        pdf.close()
+
+def _pdfminer_pages(pdf_file, indices):
+    # pdfminer's own text pass: layout analysis into lines, without pdfplumber's per-character objects
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    rsrc, texts, wanted = PDFResourceManager(caching=True), {}, set(indices)
+    f = _source(pdf_file)
+    with open(f, "rb") if isinstance(f, str) else f as fp:
+        for i, page in enumerate(PDFPage.get_pages(fp)):
+            if i > max(wanted, default=-1):
+                break
+            if i not in wanted:
+                continue
+            buf = io.StringIO()
+            device = TextConverter(rsrc, buf, laparams=LAParams())
+            PDFPageInterpreter(rsrc, device).process_page(page)
+            device.close()
+            texts[i] = buf.getvalue().rstrip()
+    return [texts.get(i, "") for i in indices]
+
+def _pdfplumber_pages(pdf_file, indices):
+    import pdfplumber
+    texts = []
+    with pdfplumber.open(_source(pdf_file)) as pdf:
+        for i in indices:
+            page = pdf.pages[i]
+            texts.append(page.extract_text() or "")
+            page.close()  # drop cached layout objects
+    return texts
+
+# name -> fn(pdf path or bytes, page indices) -> page texts
+PDF_BACKENDS = {"pypdfium2": _pypdfium2_pages, "pdfminer": _pdfminer_pages, "pdfplumber": _pdfplumber_pages}
+
+def page_needs_fallback(text):
+    """True for a page with no text, or one that is mostly unmapped glyphs or non-letters (a broken font encoding)."""
+    chars = "".join(text.split())
+    if not chars:
+        return True
+    garbled = sum(len(m) for m in _GARBLED_RE.findall(chars))
+    return garbled > 0.1 * len(chars) or sum(c.isalpha() for c in chars) < 0.3 * len(chars)
+
+def _page_count(pdf_file):
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(pdf_file)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+def _extract_page_range(pdf_file, start, stop, backend="pdfplumber"):
+    """Texts of pages [start, stop) and how many were re-extracted with pdfplumber after the backend failed."""
+    texts = PDF_BACKENDS[backend](pdf_file, list(range(start, stop)))
+    retry = [i for i, t in enumerate(texts) if backend != "pdfplumber" and page_needs_fallback(t)]
+    if retry:
+        for i, text in zip(retry, _pdfplumber_pages(pdf_file, [start + i for i in retry])):
+            if text.strip():  # a scanned page stays empty either way
+                texts[i] = text
+    return texts, len(retry)
+
+def iter_pdf_pages(pdf_file, pages_per_task=8, min_parallel_pages=16, parallel=True, backend=None):
+    """Yield page texts in page order, parsing page ranges in a shared process pool.
+
+    backend (default PAPER_PDF_BACKEND) is a PDF_BACKENDS name; pages it returns empty
+    or garbled are re-extracted with pdfplumber. Small documents and file-like inputs
+    are parsed serially in-process, where pool start-up and pickling would cost more
+    than they save.
+    """
+    backend = backend or PDF_BACKEND
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}")
+    if not isinstance(pdf_file, str):
+        pdf_file = pdf_file.read()
+    n = _page_count(pdf_file)
+    # a one-page first task keeps time-to-first-page low for downstream stages
+    ranges = [(0, min(1, n))] + [(s, min(s + pages_per_task, n)) for s in range(1, n, pages_per_task)]
+    if not parallel or not isinstance(pdf_file, str) or n < min_parallel_pages:
+        yield from _serial_pages(pdf_file, ranges, backend)
+        return
+    pool = _page_pool()
+    window = 2 * PAGE_WORKERS
+    done, pending = 0, []
+    try:
+        pending = [pool.submit(_extract_page_range, pdf_file, s, e, backend) for s, e in ranges[:window]]
+        while pending:
+            texts, fallbacks = pending.pop(0).result()
+            if fallbacks:
+                METRICS.inc("pdf_page_fallbacks_total", fallbacks, backend=backend)
+            if done + len(pending) + 1 < len(ranges):
+                s, e = ranges[done + len(pending) + 1]
+                pending.append(pool.submit(_extract_page_range, pdf_file, s, e, backend))
+            done += 1
+            yield from texts
+    except BrokenProcessPool:
+        # a page worker died (segfault, OOM): later documents get a new pool, this one finishes here
+        METRICS.inc("pdf_page_pool_broken_total")
+        _reset_page_pool(pool)
+        pending = []
+        yield from _serial_pages(pdf_file, ranges[done:], backend)
+    finally:
+        for f in pending:
+            f.cancel()
+
+def _serial_pages(pdf_file, ranges, backend):
+    for s, e in ranges:
+        texts, fallbacks = _extract_page_range(pdf_file, s, e, backend)
+        if fallbacks:
+            METRICS.inc("pdf_page_fallbacks_total", fallbacks, backend=backend)
+        yield from texts
+
+# ====== LONG-DOCUMENT ANALYSIS ======
+ANALYSIS_FIELDS = '''{ "title": "", "authors": [], "abstract": "",
+           "key_concepts": [], "methodology": "", "main_findings": [] }'''
+# numbered ("3.2 Results", "IV. EXPERIMENTS") or well-known unnumbered section headings, one per line
+_HEADING_RE = re.compile(
+    r"^[ \t]*(?:(?:\d+(?:\.\d+)*|[IVX]+)\.?[ \t]+[A-Z][^\n]{0,80}"
+    r"|(?i:abstract|introduction|background|related work|methods?|methodology|experiments?|evaluation|results"
+    r"|discussion|conclusions?|references|bibliography|acknowledge?ments?|appendix)\b[^\n]{0,60})$", re.M)
+_REFERENCES_RE = re.compile(r"\s*(?:\d+\.?\s+)?(?i:references|bibliography)\s*$", re.M)
+# headings that end a references section; numbered lines after "References" are bibliography entries
+_NAMED_HEADING_RE = re.compile(
+    r"[ \t]*(?:(?:\d+(?:\.\d+)*|[IVX]+|[A-Z])\.?[ \t]+)?(?i:abstract|introduction|background|related work"
+    r"|methods?|methodology|experiments?|evaluation|results|discussion|conclusions?|acknowledge?ments?"
+    r"|appendix|appendices|supplementary)\b")
+
+def section_windows(text, max_chars=8000):
+    """Split text into windows of at most max_chars, cutting at section headings where possible.
+
+    Sections are packed greedily; a section longer than max_chars is cut at line
+    breaks. The references section is dropped.
+    """
+    starts, in_references = [], False
+    for m in _HEADING_RE.finditer(text):
+        if _REFERENCES_RE.match(m.group()):
+            in_references = True
+        elif in_references and not _NAMED_HEADING_RE.match(m.group()):
+            continue  # "12. Vaswani A, ..." is an entry, not a section
+        else:
+            in_references = False
+        starts.append(m.start())
+    bounds = sorted({0, len(text), *starts})
+    pieces = []
+    for a, b in zip(bounds, bounds[1:]):
+        section = text[a:b]
+        if _REFERENCES_RE.match(section.split("\n", 1)[0]):
+            continue
+        while len(section) > max_chars:
+            cut = section.rfind("\n", 0, max_chars)
+            cut = cut + 1 if cut > max_chars // 2 else max_chars
+            pieces.append(section[:cut])
+            section = section[cut:]
+        pieces.append(section)
+    windows = [""]
+    for piece in pieces:
+        if windows[-1] and len(windows[-1]) + len(piece) > max_chars:
+            windows.append("")
+        windows[-1] += piece
+    return [w for w in windows if w.strip()]
+
+def parse_json_object(raw):
+    """The first {...} object in an LLM reply, or {} when there is none or it doesn't parse."""
+    m = re.search(r"\{.*\}", raw or "", re.S)
+    try:
+        return json.loads(m.group()) if m else {}
+    except ValueError:
+        return {}
+
+def merge_analyses(partials):
+    """Field-wise merge of partial analyses: first non-empty scalar, order-preserving union of lists."""
+    merged = {}
+    for field in ("title", "authors", "abstract", "key_concepts", "methodology", "main_findings"):
+        values = [p.get(field) for p in partials if p.get(field)]
+        if field in ("authors", "key_concepts", "main_findings"):
+            items = [v for value in values for v in (value if isinstance(value, list) else [value])]
+            merged[field] = list(dict.fromkeys(str(v) for v in items))
+        elif field == "methodology":
+            merged[field] = " ".join(dict.fromkeys(str(v) for v in values))
+        else:
+            merged[field] = values[0] if values else ""
+    return merged
 
 # ====== PAPER PROCESSOR ======
 class RAGResearchProcessorLLM:
-    def __init__(self, llm: LLMBackend):
+    MAX_INDEXES = 8
+    FUSION_DEPTH = 20  # candidates taken from each ranking before reciprocal-rank fusion
+    WINDOW_CHARS, MAX_WINDOWS, MAX_WINDOW_CHARS, CHUNK_OVERLAP = 8000, 8, 24000, 32
+    # bump when the stage's code changes its output; ArtifactStore keys include these
+    ANALYSIS_VERSION, CHUNKS_VERSION = 2, 2
+
+    def __init__(self, llm: LLMBackend, embedder_name="all-MiniLM-L6-v2", cache_dir=CACHE_DIR, doc_cache=None,
+                 embedder=None, retrieval=RETRIEVAL_MODE, embedding_dtype=EMBEDDING_DTYPE, pdf_backend=PDF_BACKEND):
+        if retrieval not in ("hybrid", "dense", "lexical"):
+            raise ValueError(f"Unknown retrieval mode: {retrieval}")
+        if embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unknown embedding dtype: {embedding_dtype}")
+        if pdf_backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend: {pdf_backend}")
         self.llm = llm
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+        self.pdf_backend = pdf_backend
+        self.retrieval = retrieval
+        self.embedding_dtype = embedding_dtype
+        self.embedder_name = embedder_name
+        self._embedder = embedder
+        self.cache_dir = cache_dir
+        self.doc_cache = doc_cache or (DocumentCache(cache_dir) if cache_dir else None)
+        self.last_document_hash = None
+        self._indexes = {}
+        self._lexical = {}
+
+    @property
+    def embedder(self):
+        # resolved on first use, so extraction and analysis can start while the model is still loading
+        if self._embedder is None:
+            self._embedder = shared_embedder(self.embedder_name)
+        return self._embedder
+
+    def fetch_document(self, url):
+        """Download (or revalidate) url into the document cache; returns (sha256, local_path)."""
+        sha, path = self.doc_cache.fetch(url)
+        self.last_document_hash = sha
+        return sha, path
+
+    def iter_cached_pages(self, sha, path):
+        """Yield page dicts for a cached PDF, parsing it only if its page text is not stored yet."""
+        cached = self.doc_cache.load_pages(sha, self.pdf_backend)
+        METRICS.inc("cache_requests_total", cache="pages", result="hit" if cached is not None else "miss")
+        texts = cached if cached is not None else iter_pdf_pages(path, backend=self.pdf_backend)
+        parsed = []
+        t0 = time.perf_counter()
+        for i, text in enumerate(texts):
+            parsed.append(text)
+            yield {"page_number": i + 1, "content": text}
+        if cached is None:
+            record_dependency(self.pdf_backend, t0, time.perf_counter() - t0, pages=len(parsed))
+            self.doc_cache.store_pages(sha, parsed, self.pdf_backend)
+
+    def iter_document_pages(self, url):
+        """Yield {"page_number", "content"} dicts in order as soon as each page is available."""
+        if self.doc_cache is not None:
+            yield from self.iter_cached_pages(*self.fetch_document(url))
+            return
+        with dependency("pdf_download"):
+            r = requests.get(url, timeout=(10, 60))
+            r.raise_for_status()
+        t0 = time.perf_counter()
+        for i, text in enumerate(iter_pdf_pages(io.BytesIO(r.content), backend=self.pdf_backend)):
+            yield {"page_number": i + 1, "content": text}
+        record_dependency(self.pdf_backend, t0, time.perf_counter() - t0)
 
     def extract_document_text(self, url):
-        r = requests.get(url)
-        pdf_file = io.BytesIO(r.content)
-        full_text, pages = "", []
-        with pdfplumber.open(pdf_file) as pdf:
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text() or ""
-                full_text += text + "\n"
-                pages.append({"page_number": i + 1, "content": text})
+        with span("extract") as attrs:
+            pages = list(self.iter_document_pages(url))
+            attrs["pages"] = len(pages)
+        full_text = "".join(p["content"] + "\n" for p in pages)
         return full_text, pages
 
-    def analyze_research_paper(self, text):
-        prompt = f"""
+    def analysis_config(self):
+        return {"version": self.ANALYSIS_VERSION, "model": self.llm.model, "window_chars": self.WINDOW_CHARS,
+                "max_windows": self.MAX_WINDOWS, "max_window_chars": self.MAX_WINDOW_CHARS,
+                "pdf_backend": self.pdf_backend}
+
+    def chunks_config(self):
+        return {"version": self.CHUNKS_VERSION, "embedder": self.embedder_name, "overlap": self.CHUNK_OVERLAP,
+                "retrieval": self.retrieval, "pdf_backend": self.pdf_backend}
+
+    def analyze_research_paper(self, text, window_chars=None, max_windows=None):
+        """Extract the analysis JSON from the whole paper.
+
+        A paper that fits in one window_chars window takes one call. Longer ones are
+        cut into section-aligned windows (widened towards max_windows windows, but never
+        past MAX_WINDOW_CHARS, so very long papers get more windows), each is extracted
+        concurrently (map) within the LLM scheduler's rate limits, and a final call
+        merges the partial results (reduce).
+        """
+        window_chars, max_windows = window_chars or self.WINDOW_CHARS, max_windows or self.MAX_WINDOWS
+        cap = max(window_chars, self.MAX_WINDOW_CHARS)
+        size = min(cap, max(window_chars, -(-len(text) // max_windows)))
+        windows = section_windows(text, size)
+        while len(windows) > max_windows and size < cap:  # packing at section breaks leaves slack: widen
+            size = min(cap, size * 5 // 4)
+            windows = section_windows(text, size)
+        with span("analyze", windows=len(windows)):
+            if len(windows) <= 1:
+                prompt = f"""
         Extract this research paper info as JSON:
-        {{ "title": "", "authors": [], "abstract": "", 
-           "key_concepts": [], "methodology": "", "main_findings": [] }}
+        {ANALYSIS_FIELDS}
         --- TEXT ---
-        {text[:8000]}
+        {windows[0] if windows else text}
         """
-        raw = self.llm.chat(prompt)
-        try:
-            m = re.search(r"\{.*\}", raw, re.S)
-            return json.loads(m.group()) if m else {}
-        except:
-            return {}
+                report_prompt("analysis", prompt)
+                return parse_json_object(self.llm.chat(prompt, cache=True, accept=parse_json_object))
+            extract = in_context(lambda i: self._analyze_window(windows[i], i, len(windows)))
+            with ThreadPoolExecutor(max_workers=min(len(windows), max_windows)) as pool:
+                partials = [p for p in pool.map(extract, range(len(windows))) if p]
+            return self._reduce_analyses(partials)
 
-    def create_rag_chunks(self, pages, chunk_size=500):
-        chunks = []
-        for p in pages:
-            text = p["content"]
-            if not text.strip(): continue
-            sentences = re.split(r"[.!?]+", text)
-            buf = ""
-            for s in sentences:
-                if len(buf) + len(s) < chunk_size:
-                    buf += s + ". "
-                else:
-                    chunks.append({"page": p["page_number"], "content": buf})
-                    buf = s + ". "
-            if buf: chunks.append({"page": p["page_number"], "content": buf})
+    def _analyze_window(self, window, i, n):
+        prompt = f"""
+        Extract research paper info as JSON from part {i + 1} of {n} of the paper.
+        Fill only what this part states; leave other fields empty. Title, authors
+        and abstract usually appear only in part 1.
+        {ANALYSIS_FIELDS}
+        --- PART {i + 1}/{n} ---
+        {window}
+        """
+        report_prompt("analysis", prompt)
+        return parse_json_object(self.llm.chat(prompt, cache=True, accept=parse_json_object))
+
+    def _reduce_analyses(self, partials):
+        """One call merging the partial extractions; falls back to a field-wise merge if it fails."""
+        if len(partials) <= 1:
+            return partials[0] if partials else {}
+        prompt = f"""
+        Merge these partial extractions from consecutive parts of one research paper
+        into a single JSON object. Take title, authors and abstract from the earliest
+        part that has them; combine and deduplicate key_concepts; summarize the
+        methodology across parts; keep the most important distinct main_findings.
+        {ANALYSIS_FIELDS}
+        --- PARTS ---
+        {json.dumps(partials, ensure_ascii=False)}
+        """
+        report_prompt("analysis_merge", prompt)
+        merged = parse_json_object(self.llm.chat(prompt, cache=True, accept=parse_json_object))
+        return merged if merged.get("title") or merged.get("main_findings") else merge_analyses(partials)
+
+    def count_tokens(self, texts):
+        """Token counts under the embedder's own tokenizer (a character estimate if it has none)."""
+        # lexical-only mode never loads the model, so it chunks by the estimate
+        tokenizer = getattr(self.embedder, "tokenizer", None) if self.retrieval != "lexical" else None
+        if tokenizer is None:
+            return [estimate_tokens(t) for t in texts]
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def create_rag_chunks(self, pages, max_tokens=None, overlap=None):
+        """Chunk an iterable of page dicts into a ChunkStore and index it for the retrieval mode.
+
+        max_tokens defaults to the embedder's window (256 for MiniLM) minus its two special tokens,
+        so no chunk is truncated at embedding time.
+        """
+        with span("chunk") as attrs:
+            if not max_tokens:
+                window = getattr(self.embedder, "max_seq_length", 256) if self.retrieval != "lexical" else 256
+                max_tokens = window - 2
+            overlap = self.CHUNK_OVERLAP if overlap is None else overlap
+            chunks = ChunkStore.from_pages(pages, self.count_tokens, max_tokens, overlap)
+            attrs["chunks"] = len(chunks)
+            texts = chunks.texts()
+            if self.retrieval != "lexical":
+                self._dense_index(texts)
+            if self.retrieval != "dense":
+                self._lexical_index(texts)
         return chunks
 
-    def retrieve_relevant_chunks(self, query, chunks, top_k=3):
-        """Return top_k text chunks most similar to query."""
-        # Handle both dict format (with "content" key) and string format
-        texts = []
-        for c in chunks:
-            if isinstance(c, dict):
-                texts.append(c.get("content", c.get("text", str(c))))
+    def build_index(self, chunks):
+        """Embed chunks once; reuse the in-memory or on-disk (mmap) index for the same content."""
+        texts = chunk_texts(chunks)
+        return self._dense_index(texts), texts
+
+    def _dense_index(self, texts):
+        key = content_hash(texts, self.embedder_name)
+        index = self._indexes.get((key, self.embedding_dtype))
+        if index is None:
+            index = ChunkIndex.load_or_build(self.embedder, texts, key, self.cache_dir, self.embedding_dtype)
+            if len(self._indexes) >= self.MAX_INDEXES:
+                self._indexes.pop(next(iter(self._indexes)))
+            self._indexes[(key, self.embedding_dtype)] = index
+        return index
+
+    def _lexical_index(self, texts):
+        key = content_hash(texts, "bm25")
+        index = self._lexical.get(key)
+        if index is None:
+            index = BM25Index(texts)
+            if len(self._lexical) >= self.MAX_INDEXES:
+                self._lexical.pop(next(iter(self._lexical)))
+            self._lexical[key] = index
+        return index
+
+    def add_to_store(self, store, paper_id, chunks, save=True):
+        """Add a paper's chunks to a multi-paper vector_store.VectorStore, reusing its chunk index.
+
+        save=False leaves store.save() to the caller, once for a whole batch of papers.
+        """
+        index, texts = self.build_index(chunks)
+        if isinstance(chunks, ChunkStore):
+            pages = chunks.pages
+        else:
+            pages = [c.get("page", 0) if isinstance(c, dict) else 0 for c in chunks]
+        store.add(paper_id, index.dequantized(), pages, texts)
+        if save:
+            store.save()
+
+    def embed_query(self, query):
+        """L2-normalized embedding of one query string."""
+        with dependency("embedder", texts=1):
+            return _normalize(self.embedder.encode([query]))[0]
+
+    def search_store(self, store, query, top_k=5, papers=None, pages=None):
+        """Approximate top_k chunks across the store, optionally limited to papers / a (first, last) page range."""
+        with span("library_search"):
+            return store.search(self.embed_query(query), top_k, papers=papers, pages=pages)
+
+    def retrieve_relevant_chunks(self, query, chunks, top_k=3, mode=None, q_vec=None):
+        """Return the top_k chunks for query.
+
+        mode (default: the processor's retrieval mode) is "dense" (cosine similarity), "lexical" (BM25,
+        no embedder) or "hybrid" (both rankings fused by reciprocal rank; scores are then RRF scores).
+        q_vec, when the caller already has embed_query(query), skips encoding it again.
+        """
+        mode = mode or self.retrieval
+        with span("retrieve", mode=mode):
+            texts = chunk_texts(chunks)
+            if mode == "lexical":
+                idx, scores = self._lexical_index(texts).search(query, top_k)
+            else:
+                index = self._dense_index(texts)
+                if q_vec is None:
+                    q_vec = self.embed_query(query)
+                if mode == "dense":
+                    idx, scores = index.search(q_vec, top_k)
+                else:
+                    depth = max(top_k, self.FUSION_DEPTH)
+                    dense_idx, _ = index.search(q_vec, depth)
+                    lexical_idx, _ = self._lexical_index(texts).search(query, depth)
+                    idx, scores = reciprocal_rank_fusion([dense_idx, lexical_idx], top_k)
+        return [{"text": texts[i], "score": float(s)} for i, s in zip(idx, scores)]
+
+# ====== QUESTION CACHE ======
+class SemanticAnswerCache:
+    """Process-wide cache of chat answers per paper, matched by query-embedding similarity.
+
+    A question whose normalized embedding has cosine >= threshold with an earlier
+    question about the same paper gets that answer (and its source chunks) back.
+    Bounded to max_entries with least-recently-used eviction; invalidate(paper_id)
+    drops a paper's answers when its chunks or analysis change.
+    """
+    def __init__(self, threshold=0.9, max_entries=5000):
+        self.threshold, self.max_entries = threshold, max_entries
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()  # id -> entry dict, least recently used first
+        self._papers = {}              # paper_id -> (ids, vectors) for a one mat-vec lookup, rebuilt on change
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _matrix(self, paper_id):
+        cached = self._papers.get(paper_id)
+        if cached is None:
+            ids = [i for i, e in self._entries.items() if e["paper_id"] == paper_id]
+            vecs = np.stack([self._entries[i]["vector"] for i in ids]) if ids else None
+            cached = self._papers[paper_id] = (ids, vecs)
+        return cached
+
+    def lookup(self, paper_id, q_vec):
+        """The best earlier answer for this paper at or above the threshold (with its similarity), or None."""
+        with self._lock:
+            ids, vecs = self._matrix(paper_id)
+            entry = None
+            if ids:
+                sims = vecs @ np.asarray(q_vec, np.float32)
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self._entries.move_to_end(ids[best])
+                    entry = dict(self._entries[ids[best]], similarity=float(sims[best]))
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        METRICS.inc("cache_requests_total", cache="question", result="hit" if entry else "miss")
+        return entry
+
+    def store(self, paper_id, question, q_vec, answer, sources=()):
+        with self._lock:
+            self._entries[self._next_id] = {"paper_id": paper_id, "question": question, "answer": answer,
+                                            "sources": list(sources), "created": time.time(),
+                                            "vector": np.asarray(q_vec, np.float32)}
+            self._next_id += 1
+            self._papers.pop(paper_id, None)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._papers.pop(evicted["paper_id"], None)
+
+    def invalidate(self, paper_id):
+        """Forget every answer about paper_id; returns how many were dropped."""
+        with self._lock:
+            ids = [i for i, e in self._entries.items() if e["paper_id"] == paper_id]
+            for i in ids:
+                del self._entries[i]
+            self._papers.pop(paper_id, None)
+            return len(ids)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "papers": len({e["paper_id"] for e in self._entries.values()}),
+                    "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+def question_cache():
+    """The SemanticAnswerCache shared by every session in this process."""
+    return shared_resource(("question_cache",), SemanticAnswerCache)
+
+# ====== CITATION LOOKUP ======
+def arxiv_id_from_url(url):
+    m = re.search(r"arxiv\.org/(?:abs|pdf)/([\w.\-/]+?)(?:v\d+)?(?:\.pdf)?$", url or "")
+    return f"arXiv:{m.group(1)}" if m else None
+
+class CitationLookup:
+    """Semantic Scholar citation counts over a pooled session, batched by paper ID where known.
+
+    Every result carries a status: "cached" (from the TTL'd on-disk cache),
+    "fresh" (fetched now) or "failed" (citations is None, never reported as 0).
+    """
+    BASE_URL = "https://api.semanticscholar.org/graph/v1"
+
+    def __init__(self, base_url=None, cache_path=None, ttl=7 * 24 * 3600, session=None, timeout=15,
+                 pool_size=10, batch_size=500, max_workers=4, backoff_factor=1.0):
+        self.base_url = (base_url or os.getenv("S2_API_URL") or self.BASE_URL).rstrip("/")
+        self.cache_path = cache_path or os.path.join(CACHE_DIR, "citations.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        sqlite_execute(self.cache_path, "CREATE TABLE IF NOT EXISTS citations "
+                       "(key TEXT PRIMARY KEY, paper_id TEXT, citations INTEGER, fetched REAL)")
+        self.ttl, self.timeout = ttl, timeout
+        self.batch_size, self.max_workers = batch_size, max_workers
+        self.session = session or requests.Session()
+        retry = Retry(total=3, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=None, respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if os.getenv("S2_API_KEY"):
+            self.session.headers["x-api-key"] = os.getenv("S2_API_KEY")
+
+    def _cached(self, key):
+        rows = sqlite_execute(self.cache_path, "SELECT paper_id, citations FROM citations WHERE key = ? AND fetched > ?",
+                              (key, time.time() - self.ttl))
+        METRICS.inc("cache_requests_total", cache="citations", result="hit" if rows else "miss")
+        if rows:
+            return {"paper_id": rows[0][0], "citations": rows[0][1], "status": "cached"}
+        return None
+
+    def _store(self, key, paper_id, citations):
+        sqlite_execute(self.cache_path, "INSERT OR REPLACE INTO citations VALUES (?, ?, ?, ?)",
+                       (key, paper_id, citations, time.time()))
+        return {"paper_id": paper_id, "citations": citations, "status": "fresh"}
+
+    @staticmethod
+    def _failed(error):
+        return {"paper_id": None, "citations": None, "status": "failed", "error": str(error)}
+
+    def by_title(self, title):
+        key = "title:" + " ".join(title.lower().split())
+        hit = self._cached(key)
+        if hit:
+            return hit
+        try:
+            with dependency("semantic_scholar", endpoint="search"):
+                r = self.session.get(f"{self.base_url}/paper/search", timeout=self.timeout,
+                                     params={"query": title, "limit": 1, "fields": "citationCount"})
+                r.raise_for_status()
+                data = r.json().get("data", [])
+        except (requests.RequestException, ValueError) as e:
+            return self._failed(e)
+        if not data:
+            return self._failed("no search match")
+        return self._store(key, data[0].get("paperId"), data[0].get("citationCount") or 0)
+
+    def by_ids(self, paper_ids):
+        """Map each ID (S2 ID, "arXiv:...", "DOI:...") to a result, one POST per batch_size uncached IDs."""
+        results, todo = {}, []
+        for pid in dict.fromkeys(paper_ids):
+            hit = self._cached("id:" + pid)
+            if hit:
+                results[pid] = hit
             else:
-                texts.append(str(c))
-        
-        q_emb = self.embedder.encode([query])
-        c_embs = self.embedder.encode(texts)
-        sims = cosine_similarity(q_emb, c_embs)[0]
-        top_idx = np.argsort(sims)[::-1][:top_k]
-        return [{"text": texts[i], "score": float(sims[i])} for i in top_idx]
+                todo.append(pid)
+        for i in range(0, len(todo), self.batch_size):
+            batch = todo[i:i + self.batch_size]
+            try:
+                with dependency("semantic_scholar", endpoint="batch", ids=len(batch)):
+                    r = self.session.post(f"{self.base_url}/paper/batch", params={"fields": "citationCount"},
+                                          json={"ids": batch}, timeout=self.timeout)
+                    r.raise_for_status()
+                    rows = r.json()
+            except (requests.RequestException, ValueError) as e:
+                results.update({pid: self._failed(e) for pid in batch})
+                continue
+            for pid, row in zip(batch, rows):
+                if row is None:
+                    results[pid] = self._failed("unknown paper id")
+                else:
+                    results[pid] = self._store("id:" + pid, row.get("paperId"), row.get("citationCount") or 0)
+        return results
+
+    def lookup_many(self, papers):
+        """papers: [{"title": ..., "paper_id": optional}] -> one result per paper, in order."""
+        by_id = self.by_ids([p["paper_id"] for p in papers if p.get("paper_id")])
+        out = [by_id.get(p.get("paper_id")) for p in papers]
+        # unknown IDs fall back to a title search, as do papers without an ID
+        missing = [i for i, r in enumerate(out) if r is None or r["status"] == "failed"]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            search = in_context(lambda i: self.by_title(papers[i].get("title", "")))
+            for i, r in zip(missing, pool.map(search, missing)):
+                if out[i] is None or r["status"] != "failed":
+                    out[i] = r
+        return out
 
 # ====== CIR ESTIMATOR ======
+def parse_novelty(raw):
+    """The novelty score in an LLM reply, clamped to [0, 1], or None when there is none."""
+    # the prompt's own example uses single quotes, which replies often copy
+    m = re.search(r"""novelty['"]?\s*:\s*['"]?(\d*\.?\d+)""", raw or "", re.I)
+    return min(1.0, float(m.group(1))) if m else None
+
 class CIREstimator:
-    def __init__(self, llm: LLMBackend):
+    VERSION = 3
+
+    def __init__(self, llm: LLMBackend, citations=None):
         self.llm = llm
+        self.citations = citations or CitationLookup()
 
-    def fetch_citations(self, title: str):
-        try:
-            api = f"https://api.semanticscholar.org/graph/v1/paper/search?query={title}&limit=1&fields=citationCount"
-            r = requests.get(api, timeout=15)
-            data = r.json().get("data", [])
-            return data[0].get("citationCount", 0) if data else 0
-        except:
-            return 0
+    def config(self):
+        return {"version": self.VERSION, "model": self.llm.model, "prompt_budget": prompt_budget("novelty")}
+
+    def lookup_citations(self, title: str, paper_id=None):
+        return self.citations.lookup_many([{"title": title, "paper_id": paper_id}])[0]
+
+    def fetch_citations(self, title: str, paper_id=None):
+        """Citation count, or None when it could not be determined."""
+        return self.lookup_citations(title, paper_id)["citations"]
 
     def estimate_novelty(self, abstract: str):
-        prompt = f"Rate novelty 0-1 as JSON: {{'novelty': value}} Abstract: {abstract}"
+        """Novelty in [0, 1], or None when the LLM call failed or its reply held no score."""
+        prompt, _ = compile_prompt("novelty", "Rate novelty 0-1 as JSON: {{'novelty': value}} Abstract: {context}",
+                                   [abstract] if abstract else [])
         try:
-            raw = self.llm.chat(prompt)
-            m = re.search(r"\{.*\}", raw, re.S)
-            return json.loads(m.group()).get("novelty", 0.5)
-        except:
-            return 0.5
-
-    def compute_cir(self, title: str, abstract: str):
-        cit = self.fetch_citations(title)
-        novelty = self.estimate_novelty(abstract)
-        norm_cit = min(1.0, cit / 100)
-        cir = 0.5 * norm_cit + 0.5 * novelty
-        return {"citations": cit, "novelty": round(novelty, 2), "CIR": round(cir, 2)}
+            raw = self.llm.chat(prompt, cache=True, accept=lambda r: parse_novelty(r) is not None)
+        except Exception as e:
+            METRICS.inc("cir_novelty_failures_total", error=type(e).__name__)
+            return None
+        novelty = parse_novelty(raw)
+        if novelty is None:
+            METRICS.inc("cir_novelty_failures_total", error="unparsed")
+        return novelty
+
+    def _score(self, lookup, novelty):
+        cit = lookup["citations"]
+        # without a citation count there is no CIR: novelty alone would rank unknown papers above cited ones
+        cir = None if cit is None or novelty is None else round(0.5 * min(1.0, cit / 100) + 0.5 * novelty, 2)
+        return {"citations": cit, "citation_status": lookup["status"],
+                "novelty": None if novelty is None else round(novelty, 2),
+                "novelty_status": "failed" if novelty is None else "ok", "CIR": cir}
+
+    def compute_cir(self, title: str, abstract: str, paper_id=None):
+        with span("cir"):
+            return self._score(self.lookup_citations(title, paper_id), self.estimate_novelty(abstract))
+
+    def compute_cir_batch(self, papers: List[Dict]):
+        """papers: [{"title", "abstract", "paper_id" (optional)}] -> compute_cir result per paper."""
+        with span("cir", papers=len(papers)):
+            lookups = self.citations.lookup_many(papers)
+            return [self._score(l, self.estimate_novelty(p.get("abstract", ""))) for p, l in zip(papers, lookups)]
 
 # ====== CLAIM SUPPORT ======
+# opt-in until its thresholds are measured against the real model and LLM, e.g. cross-encoder/nli-deberta-v3-xsmall
+NLI_MODEL = os.getenv("PAPER_NLI_MODEL", "")
+
+class NLIPrescreen:
+    """Local CPU NLI cross-encoder over (evidence, claim) pairs.
+
+    A claim is decided here when its best entailment probability over its
+    evidence is at least support (SUPPORTED) or at most reject (UNSUPPORTED);
+    claims in between are left to the LLM.
+    """
+    VERSION = 1
+    DEFAULT_MODEL = "cross-encoder/nli-deberta-v3-xsmall"
+
+    def __init__(self, model_name=None, support=0.9, reject=0.1, batch_size=32, model=None):
+        self.model_name = model_name or NLI_MODEL or self.DEFAULT_MODEL
+        self.support, self.reject = support, reject
+        self.batch_size = batch_size
+        self._model = model
+        self._load_error = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            if self._load_error is not None:  # don't retry a failed load (offline, missing package) per call
+                raise self._load_error
+            try:
+                self._model = shared_cross_encoder(self.model_name)
+            except Exception as e:
+                self._load_error = e
+                raise
+        return self._model
+
+    def config(self):
+        return {"version": self.VERSION, "model": self.model_name, "support": self.support, "reject": self.reject}
+
+    def _columns(self):
+        """(entailment, contradiction) logit columns from the model's labels; NLI cross-encoders default
+        to contradiction, entailment, neutral."""
+        config = getattr(self.model, "config", None) or getattr(getattr(self.model, "model", None), "config", None)
+        labels = [str(l).lower() for _, l in sorted((getattr(config, "id2label", None) or {}).items())]
+        if "entailment" in labels and "contradiction" in labels:
+            return labels.index("entailment"), labels.index("contradiction")
+        return 1, 0
+
+    def entailment(self, claims, evidence):
+        """Best entailment probability of each claim over its evidence passages (0 without evidence)."""
+        pairs = [(passage, claim) for claim, ev in zip(claims, evidence) for passage in ev]  # premise first
+        best = np.zeros(len(claims), dtype=np.float32)
+        if not pairs:
+            return best
+        with dependency("nli", pairs=len(pairs)):
+            logits = np.asarray(self.model.predict(pairs, batch_size=self.batch_size), dtype=np.float32)
+        logits = logits.reshape(len(pairs), -1)
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs /= probs.sum(axis=1, keepdims=True)
+        entail = probs[:, self._columns()[0]]
+        owners = np.repeat(np.arange(len(claims)), [len(ev) for ev in evidence])
+        np.maximum.at(best, owners, entail)
+        return best
+
+    def screen(self, claims, evidence):
+        """True / False for claims decided locally, None for the ones the LLM should verify."""
+        return [True if p >= self.support else False if p <= self.reject else None
+                for p in self.entailment(claims, evidence).tolist()]
+
+def parse_verdict_rows(raw):
+    """The first [...] array in an LLM reply, or None when there is none or it doesn't parse."""
+    m = re.search(r"\[.*\]", raw or "", re.S)
+    try:
+        return json.loads(m.group()) if m else None
+    except ValueError:
+        return None
+
 class LLMUCREvaluator:
-    def __init__(self, llm: LLMBackend):
+    VERSION = 3
+
+    def __init__(self, llm: LLMBackend, retriever=None, batch_size=8, max_concurrency=4, evidence_k=2,
+                 prescreen=None):
         self.llm = llm
+        self.retriever = retriever  # anything with retrieve_relevant_chunks(query, chunks, top_k)
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.evidence_k = evidence_k
+        # False disables the local pre-screen; None uses PAPER_NLI_MODEL when one is set
+        self.prescreen = (NLIPrescreen() if NLI_MODEL else None) if prescreen is None else prescreen or None
+
+    def config(self):
+        return {"version": self.VERSION, "model": self.llm.model, "batch_size": self.batch_size,
+                "evidence_k": self.evidence_k, "retrieval": getattr(self.retriever, "retrieval", None),
+                "embedding_dtype": getattr(self.retriever, "embedding_dtype", None),
+                "prompt_budget": prompt_budget("ucr"),
+                "prescreen": self.prescreen.config() if self.prescreen else None}
+
+    def _evidence(self, claims, chunks):
+        """Top evidence_k chunk texts per claim (dense retrieval if available, else word overlap)."""
+        if self.retriever is not None:
+            return [[r["text"] for r in self.retriever.retrieve_relevant_chunks(c, chunks, top_k=self.evidence_k)]
+                    for c in claims]
+        texts = chunk_texts(chunks)
+        bags = [set(re.findall(r"\w+", t.lower())) for t in texts]
+        out = []
+        for c in claims:
+            words = set(re.findall(r"\w+", c.lower()))
+            ranked = sorted(range(len(texts)), key=lambda i: -len(words & bags[i]))
+            out.append([texts[i] for i in ranked[:self.evidence_k]])
+        return out
+
+    def _verify_batch(self, batch):
+        """batch: [(claim_id, claim, evidence_texts)] -> {claim_id: supported} for every verdict parsed."""
+        def render(lines, refs):
+            items = [json.dumps({"id": cid, "claim": c, "evidence": ids}) for (cid, c, _), ids in zip(batch, refs)]
+            return ("For each claim, decide whether its evidence passages support it.\n\n"
+                    "Passages:\n" + "\n\n".join(lines) + "\n\nClaims:\n" + "\n".join(items) +
+                    '\n\nRespond with only a JSON array: [{"id": <id>, "verdict": "SUPPORTED" or "UNSUPPORTED"}, ...]')
+
+        # every claim's best passage first, then the second best, ...: a tight budget drops the weakest evidence
+        depth = max((len(ev) for _, _, ev in batch), default=0)
+        texts = [ev[r] for r in range(depth) for _, _, ev in batch if r < len(ev)]
+        budget = prompt_budget("ucr")
+        fixed = estimate_tokens(render([], [[f"P{i + 1}" for i in range(len(texts))]] * len(batch)))
+        packed = pack_context(texts, None if budget is None else max(budget - fixed, 0))
+        lines = [f"[P{n + 1}] {t}" for n, (_, t) in enumerate(packed)]
+        # a claim cites every passage holding one of its evidence sentences (overlaps are only printed once)
+        kept = [(f"P{n + 1}", sentence_keys(t)) for n, (_, t) in enumerate(packed)]
+        refs = []
+        for _, _, ev in batch:
+            wanted = set().union(*map(sentence_keys, ev))
+            refs.append([pid for pid, keys in kept if keys & wanted])
+        prompt = render(lines, refs)
+        report_prompt("ucr", prompt, sum(map(estimate_tokens, dict.fromkeys(texts))),
+                      sum(estimate_tokens(t) for _, t in packed))
+        raw = self.llm.chat(prompt, temperature=0, accept=lambda r: parse_verdict_rows(r) is not None)
+        rows = parse_verdict_rows(raw) or []
+        wanted = {cid for cid, _, _ in batch}
+        verdicts = {}
+        for row in rows:
+            if isinstance(row, dict) and row.get("id") in wanted:
+                verdicts[row["id"]] = str(row.get("verdict", "")).strip().upper() == "SUPPORTED"
+        return verdicts
+
+    def verify_claims(self, claims, chunks, stats=None):
+        """Return one verdict per claim (None when the LLM gave none), verifying batches concurrently.
+
+        With a prescreen, confident claims are decided locally and only the rest reach
+        the LLM; if the model can't be loaded or fails, every claim goes to the LLM.
+        stats (a dict), if given, receives local_decisions, llm_calls and
+        llm_calls_avoided (against sending every claim to the LLM).
+        """
+        evidence = self._evidence(claims, chunks)
+        verdicts = {}
+        if self.prescreen is not None and claims:
+            try:
+                with span("nli_prescreen", claims=len(claims)):
+                    screened = self.prescreen.screen(claims, evidence)
+                verdicts = {i: v for i, v in enumerate(screened) if v is not None}
+            except Exception as e:
+                METRICS.inc("ucr_prescreen_fallbacks_total", error=type(e).__name__)
+        items = [(i, c, ev) for i, (c, ev) in enumerate(zip(claims, evidence)) if i not in verdicts]
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        verify = in_context(self._verify_batch)
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as pool:
+            for v in pool.map(verify, batches):
+                verdicts.update(v)
+            # claims dropped from a multi-claim answer get one retry on their own
+            retry = [[it] for b in batches if len(b) > 1 for it in b if it[0] not in verdicts]
+            for v in pool.map(verify, retry):
+                verdicts.update(v)
+        local = len(claims) - len(items)
+        avoided = -(-len(claims) // self.batch_size) - len(batches)
+        METRICS.inc("ucr_claims_total", local, decided_by="nli")
+        METRICS.inc("ucr_claims_total", len(items), decided_by="llm")
+        METRICS.inc("ucr_llm_calls_avoided_total", avoided)
+        if stats is not None:
+            stats.update(local_decisions=local, llm_calls=len(batches) + len(retry), llm_calls_avoided=avoided)
+        unverified = len(claims) - len(verdicts)
+        if unverified:
+            METRICS.inc("ucr_claims_unverified_total", unverified)
+        return [verdicts.get(i) for i in range(len(claims))]
 
     def analyze_claim_support(self, text: str, chunks: List[Dict]):
         claims = [s.strip() for s in re.split(r"[.!?]+", text) if len(s.split()) > 5]
-        ctx = "\n\n".join(ch["content"] for ch in chunks[:5])
-        supported, unsupported = [], []
-        for c in claims:
-            prompt = f"Claim: {c}\nContext: {ctx}\nIs it supported? (SUPPORTED/UNSUPPORTED)"
-            r = self.llm.chat(prompt)
-            if "SUPPORTED" in r.upper():
-                supported.append(c)
-            else:
-                unsupported.append(c)
+        stats = {"local_decisions": 0, "llm_calls": 0, "llm_calls_avoided": 0}
+        with span("ucr", claims=len(claims)):
+            results = self.verify_claims(claims, chunks, stats) if claims else []
+        supported = results.count(True)
+        unsupported = results.count(False)
         total = len(claims)
+        # claims without a verdict count neither way; with none decided there is no UCR
         return {
             "total": total,
-            "supported": len(supported),
-            "unsupported": len(unsupported),
-            "UCR": len(unsupported) / total if total else 0
+            "supported": supported,
+            "unsupported": unsupported,
+            "unverified": total - supported - unsupported,
+            "UCR": unsupported / (supported + unsupported) if supported + unsupported else (None if total else 0),
+            **stats
         }
 
+# ====== ANALYSIS PIPELINE ======
+PIPELINE_STAGES = ("fetch", "analysis", "chunks", "cir", "ucr")
+
+def run_analysis(url, proc, cir, ucr, store, claims, on_stage=None):
+    """Run every stage for url, loading each from the ArtifactStore when its inputs are unchanged.
+
+    on_stage(stage, state) is called with "running", then "done" or "cached". Pages
+    are only parsed if a stage that needs them is recomputed. Returns the results
+    plus each stage's artifact key and the list of stages served from the store.
+    """
+    report = on_stage or (lambda stage, state: None)
+    report("fetch", "running")
+    sha, path = proc.fetch_document(url)
+    report("fetch", "done")
+    doc, keys, cached = {}, {}, []
+
+    def pages():
+        if "pages" not in doc:
+            with span("extract"):
+                doc["pages"] = list(proc.iter_cached_pages(sha, path))
+        return doc["pages"]
+
+    def stage(name, config, compute, max_age=None, keep=None):
+        report(name, "running")
+        value, keys[name], hit = store.memoize(sha, name, config, compute, max_age, keep)
+        if hit:
+            cached.append(name)
+        report(name, "cached" if hit else "done")
+        return value
+
+    analysis = stage("analysis", proc.analysis_config(),
+                     lambda: proc.analyze_research_paper("".join(p["content"] + "\n" for p in pages())))
+    chunks = stage("chunks", proc.chunks_config(), lambda: proc.create_rag_chunks(pages()))
+    cir_res = stage("cir", {**cir.config(), "analysis": keys["analysis"]},
+                    lambda: cir.compute_cir(analysis.get("title", ""), analysis.get("abstract", ""),
+                                            arxiv_id_from_url(url)),
+                    max_age=cir.citations.ttl,  # citation counts go stale
+                    keep=lambda r: r["citation_status"] != "failed" and r["novelty"] is not None)
+    ucr_res = stage("ucr", {**ucr.config(), "chunks": keys["chunks"], "claims": content_hash([claims])},
+                    lambda: ucr.analyze_claim_support(claims, chunks),
+                    keep=lambda r: not r["unverified"])
+    return {"sha256": sha, "analysis": analysis, "chunks": chunks, "cir": cir_res, "ucr": ucr_res,
+            "keys": keys, "cached": cached}
@@ -0,0 +1,193 @@
+"""Process-wide pipeline telemetry: stage spans, counters and latency histograms.
+
+    with trace() as t:                 # one per analysis run (optional)
+        with span("extract"):          # a pipeline stage
+            with dependency("groq"):   # a call to an external dependency
+                ...
+    METRICS.render_prometheus()        # text exposition format
+    start_http_server(9464)            # serves it on /metrics
+
+Spans are recorded into the current trace (a contextvar, so concurrent
+Streamlit sessions stay separate) and always feed the stage histogram.
+"""
+import contextvars, functools, json, os, threading, time, uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "paper_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            h = self.histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+            for i, upper in enumerate(BUCKETS):
+                if seconds <= upper:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def value(self, name, **labels):
+        return self.counters.get(self._key(name, labels), 0)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render_prometheus(self):
+        def fmt(labels, extra=()):
+            items = [f'{k}="{v}"' for k, v in labels + tuple(extra)]
+            return "{" + ",".join(items) + "}" if items else ""
+
+        lines = []
+        with self._lock:
+            counters, histograms = dict(self.counters), {k: list(v) for k, v in self.histograms.items()}
+        for name in sorted({n for n, _ in counters}):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for (n, labels), v in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{PREFIX}{name}{fmt(labels)} {v}")
+        for name in sorted({n for n, _ in histograms}):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for (n, labels), h in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for upper, count in zip(BUCKETS, h):
+                    lines.append(f"{PREFIX}{name}_bucket{fmt(labels, [('le', upper)])} {count}")
+                lines.append(f"{PREFIX}{name}_bucket{fmt(labels, [('le', '+Inf')])} {h[-1]}")
+                lines.append(f"{PREFIX}{name}_sum{fmt(labels)} {h[-2]:.6f}")
+                lines.append(f"{PREFIX}{name}_count{fmt(labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+# ---- traces and spans ----
+class Trace:
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.t0 = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_s"])
+        return {"trace_id": self.id, "started_at": self.started_at, "spans": spans}
+
+_TRACE = contextvars.ContextVar("paper_trace", default=None)
+_PARENT = contextvars.ContextVar("paper_span", default=None)
+
+@contextmanager
+def trace(path=None):
+    """Collect spans for one run; writes them as JSON to path (or $PAPER_TRACE_DIR/<id>.json) on exit."""
+    t = Trace()
+    token = _TRACE.set(t)
+    try:
+        yield t
+    finally:
+        _TRACE.reset(token)
+        path = path or (os.path.join(os.environ["PAPER_TRACE_DIR"], f"{t.id}.json")
+                        if os.getenv("PAPER_TRACE_DIR") else None)
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(t.to_dict(), f, indent=1)
+
+@contextmanager
+def _timed(kind, name, attrs):
+    t = _TRACE.get()
+    span_id = uuid.uuid4().hex[:8]
+    parent = _PARENT.set(span_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _PARENT.reset(parent)
+        elapsed = time.perf_counter() - start
+        if kind == "stage":
+            METRICS.observe("stage_seconds", elapsed, stage=name)
+        else:
+            METRICS.observe("dependency_seconds", elapsed, dependency=name)
+            if error:
+                METRICS.inc("dependency_errors_total", dependency=name)
+        if t is not None:
+            t.add({"id": span_id, "parent": _PARENT.get(), "kind": kind, "name": name,
+                   "start_s": round(start - t.t0, 6), "duration_s": round(elapsed, 6),
+                   "error": error, **attrs})
+
+def span(name, **attrs):
+    """Time a pipeline stage. The yielded dict can be filled with attributes for the trace."""
+    return _timed("stage", name, attrs)
+
+def dependency(name, **attrs):
+    """Time one call to an external dependency (network service, parser, model)."""
+    return _timed("dependency", name, attrs)
+
+def record_dependency(name, start, elapsed, error=None, **attrs):
+    """Record an already-timed dependency call (for generators, where a with-block would span yields)."""
+    METRICS.observe("dependency_seconds", elapsed, dependency=name)
+    if error:
+        METRICS.inc("dependency_errors_total", dependency=name)
+    t = _TRACE.get()
+    if t is not None:
+        t.add({"id": uuid.uuid4().hex[:8], "parent": _PARENT.get(), "kind": "dependency", "name": name,
+               "start_s": round(start - t.t0, 6), "duration_s": round(elapsed, 6), "error": error, **attrs})
+
+def in_context(fn):
+    """Wrap fn so each call runs in a copy of the caller's context (for thread pools)."""
+    ctx = contextvars.copy_context()
+    return functools.wraps(fn)(lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs))
+
+# ---- /metrics endpoint ----
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve METRICS on http://host:port/metrics from a daemon thread (idempotent per process)."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, daemon=True).start()
+        return _SERVER
@@ -0,0 +1,46 @@
+"""ArtifactStore.memoize: what is stored, what is recomputed."""
+import pytest
+
+import modules
+
+@pytest.fixture
+def store(tmp_path):
+    return modules.ArtifactStore(str(tmp_path / "artifacts"))
+
+def counting(*values):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return values[min(len(calls), len(values)) - 1]
+    return compute, calls
+
+def test_result_is_stored_once(store):
+    compute, calls = counting({"title": "T"})
+    assert store.memoize("h", "analysis", {"v": 1}, compute)[2] is False
+    value, key, hit = store.memoize("h", "analysis", {"v": 1}, compute)
+    assert hit and value == {"title": "T"} and len(calls) == 1
+    assert store.memoize("h", "analysis", {"v": 2}, compute)[1] != key  # a new config recomputes
+    assert len(calls) == 2
+
+@pytest.mark.parametrize("empty", [None, {}, []])
+def test_empty_result_is_not_stored(store, empty):
+    compute, calls = counting(empty, {"title": "T"})
+    assert store.memoize("h", "analysis", {}, compute)[0] == empty
+    value, _, hit = store.memoize("h", "analysis", {}, compute)
+    assert not hit and value == {"title": "T"} and len(calls) == 2
+
+def test_keep_rejects_failed_result(store):
+    keep = lambda r: r["citation_status"] != "failed" and r["novelty"] is not None
+    failed = {"citations": None, "citation_status": "failed", "novelty": 0.6, "CIR": None}
+    no_novelty = {"citations": 3, "citation_status": "fresh", "novelty": None, "CIR": None}
+    ok = {"citations": 3, "citation_status": "fresh", "novelty": 0.6, "CIR": 0.32}
+    compute, calls = counting(failed, no_novelty, ok)
+    hits = [store.memoize("h", "cir", {}, compute, keep=keep)[2] for _ in range(4)]
+    assert hits == [False, False, False, True] and len(calls) == 3
+
+def test_max_age_recomputes(store):
+    compute, calls = counting({"citations": 1})
+    store.memoize("h", "cir", {}, compute)
+    assert store.memoize("h", "cir", {}, compute, max_age=0)[2] is False
+    assert len(calls) == 2
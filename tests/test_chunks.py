@@ -0,0 +1,52 @@
+"""ChunkStore.from_pages: offsets into the arena, token limits and sentence overlap."""
+import re
+
+import pytest
+
+from modules import ChunkStore
+
+def words(texts):
+    return [len(t.split()) for t in texts]
+
+def paper(n_pages=4, sentences=12):
+    return [{"page_number": p, "content": " ".join(f"Page {p} sentence {i} has six words." for i in range(sentences))}
+            for p in range(1, n_pages + 1)]
+
+@pytest.mark.parametrize("overlap", [0, 8, 16])
+def test_offsets_limits_and_overlap(overlap):
+    pages = paper()
+    store = ChunkStore.from_pages(pages, words, max_tokens=20, overlap=overlap)
+    assert store.text == "".join(p["content"] + "\n" for p in pages)
+    for number, offset, page in zip(store.page_numbers, store.page_offsets, pages):
+        assert number == page["page_number"]
+        assert store.text[offset:offset + len(page["content"])] == page["content"]
+    for chunk in store:
+        assert chunk["content"] == store.text[chunk["start"]:chunk["end"]]
+        assert len(chunk["content"].split()) <= 20
+        assert chunk["content"].startswith(f"Page {chunk['page']} ")
+    overlapping = sum(b < a for a, b in zip(store.ends, store.starts[1:]))
+    assert overlapping == (len(store) - 1 if overlap else 0)
+    for (a0, a1), (b0, b1) in zip(zip(store.starts, store.ends), zip(store.starts[1:], store.ends[1:])):
+        assert a0 < b0 and a1 < b1
+        shared = store.text[b0:a1] if b0 < a1 else ""
+        assert len(shared.split()) <= overlap
+        assert shared == "" or re.fullmatch(r"(Page \d+ sentence \d+ has six words\.\s*)+", shared)
+    covered = set()
+    for chunk in store:
+        covered |= set(re.findall(r"Page \d+ sentence \d+", chunk["content"]))
+    assert len(covered) == 4 * 12
+
+def test_overlap_zero_tiles_the_text():
+    store = ChunkStore.from_pages(paper(2), words, max_tokens=20, overlap=0)
+    assert all(b >= a for a, b in zip(store.ends, store.starts[1:]))
+
+def test_chunk_may_span_a_page_break():
+    store = ChunkStore.from_pages(paper(2, sentences=3), words, max_tokens=20, overlap=0)
+    spanning = [c for c in store if "Page 1 " in c["content"] and "Page 2 " in c["content"]]
+    assert spanning and all(c["page"] == 1 for c in spanning)
+
+def test_long_sentence_split_at_words():
+    text = " ".join(f"w{i}" for i in range(50)) + "."
+    store = ChunkStore.from_pages([{"page_number": 1, "content": text}], words, max_tokens=20, overlap=0)
+    assert [len(c.split()) for c in store.texts()] == [20, 20, 10]
+    assert " ".join(store.texts()) == text
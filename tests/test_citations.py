@@ -0,0 +1,73 @@
+"""CitationLookup and CIR scoring against the local Semantic Scholar stub (benchmarks.fakes)."""
+import pytest
+
+import modules
+from benchmarks.fakes import FakeLLMBackend, FakeSemanticScholar, _citations
+
+@pytest.fixture
+def s2():
+    servers = []
+
+    def start(**kwargs):
+        server = FakeSemanticScholar(**kwargs).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def lookup(server, tmp_path):
+    return modules.CitationLookup(base_url=server.url, cache_path=str(tmp_path / "citations.sqlite"), timeout=5,
+                                  backoff_factor=0)
+
+def test_fresh_then_cached(s2, tmp_path):
+    server = s2()
+    first = lookup(server, tmp_path).by_title("Attention Is All You Need")
+    assert first["status"] == "fresh" and first["citations"] is not None
+    second = lookup(server, tmp_path).by_title("attention  is all you need")
+    assert second["status"] == "cached" and second["citations"] == first["citations"]
+    assert len(server.requests) == 1
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_failed_lookup_is_not_cached(s2, tmp_path, status):
+    server = s2(status=status)
+    result = lookup(server, tmp_path).by_title("Throttled paper")
+    assert result["status"] == "failed" and result["citations"] is None
+    assert len(server.requests) == 4  # retried 3 times
+    assert lookup(s2(), tmp_path).by_title("Throttled paper")["status"] == "fresh"
+
+def test_batch_endpoint(s2, tmp_path):
+    server = s2(unknown_ids={"arXiv:0000.00000"})
+    cl = lookup(server, tmp_path)
+    ids = ["arXiv:1706.03762", "DOI:10.1/x", "arXiv:0000.00000"]
+    out = cl.by_ids(ids)
+    assert [out[i]["status"] for i in ids] == ["fresh", "fresh", "failed"]
+    assert out["DOI:10.1/x"]["citations"] == _citations("DOI:10.1/x")
+    assert server.requests == [("POST", "/paper/batch")]
+    again = cl.by_ids(ids)
+    assert [again[i]["status"] for i in ids] == ["cached", "cached", "failed"]
+    assert server.requests == [("POST", "/paper/batch")] * 2  # only the unknown ID is asked for again
+
+def test_batch_failure(s2, tmp_path):
+    out = lookup(s2(status=429), tmp_path).by_ids(["arXiv:1706.03762"])
+    assert out["arXiv:1706.03762"]["status"] == "failed"
+
+def test_lookup_many_falls_back_to_title(s2, tmp_path):
+    server = s2(unknown_ids={"arXiv:0000.00000"})
+    out = lookup(server, tmp_path).lookup_many([{"title": "Unknown id", "paper_id": "arXiv:0000.00000"},
+                                                 {"title": "No id"}])
+    assert [r["status"] for r in out] == ["fresh", "fresh"]
+    assert sorted(m for m, _ in server.requests) == ["GET", "GET", "POST"]
+
+def test_unknown_count_has_no_cir(s2, tmp_path):
+    cir = modules.CIREstimator(FakeLLMBackend(), citations=lookup(s2(status=429), tmp_path))
+    res = cir.compute_cir("Throttled paper", "An abstract.")
+    assert res["citation_status"] == "failed" and res["citations"] is None and res["CIR"] is None
+    assert res["novelty"] == 0.62
+
+def test_known_count_scores(s2, tmp_path):
+    server = s2()
+    res = modules.CIREstimator(FakeLLMBackend(), citations=lookup(server, tmp_path)).compute_cir("Paper", "Abs.")
+    assert res["citation_status"] == "fresh"
+    assert res["CIR"] == round(0.5 * min(1.0, res["citations"] / 100) + 0.5 * 0.62, 2)
@@ -0,0 +1,69 @@
+"""JobQueue: submit dedupe, claiming, ownership and stale-job recovery (no worker processes)."""
+import sqlite3, time
+
+import pytest
+
+import jobs
+
+@pytest.fixture
+def queue(tmp_path):
+    return jobs.JobQueue(str(tmp_path / "jobs.sqlite"), stale_after=0.2, max_attempts=2)
+
+def test_submit_joins_in_flight_job_with_same_options(queue):
+    a = queue.submit("u", {"claims": "x", "k": 1})
+    assert queue.submit("u", {"k": 1, "claims": "x"}) == a
+    b = queue.submit("u", {"claims": "y"})
+    assert b != a and queue.get(b)["options"] == {"claims": "y"}
+    queue.finish(a, {})
+    assert queue.submit("u", {"claims": "x", "k": 1}) != a  # a finished job is not joined
+
+def test_claim_oldest_first_once(queue):
+    first, second = queue.submit("u1"), queue.submit("u2")
+    assert queue.claim("w1")[0] == first
+    assert queue.claim("w2")[0] == second
+    assert queue.claim("w3") is None
+    job = queue.get(first)
+    assert job["status"] == "running" and job["worker"] == "w1" and job["attempts"] == 1
+
+def test_owned_jobs_are_claimed_by_their_pool_only(queue):
+    owned = queue.submit("u1", owner="pool-a")
+    free = queue.submit("u2")
+    assert queue.claim("external")[0] == free
+    assert queue.claim("other", "pool-b") is None
+    assert queue.claim("mine", "pool-a")[0] == owned
+
+def test_requeue_stale_then_fail_after_max_attempts(queue):
+    job_id = queue.submit("crashes-its-worker")
+    queue.claim("w1")
+    assert queue.requeue_stale() == []  # heartbeat is recent
+    time.sleep(0.3)
+    assert queue.requeue_stale() == [(job_id,)]
+    assert queue.get(job_id)["status"] == "queued"
+    queue.claim("w2")
+    queue.heartbeat("w2", job_id)
+    assert queue.requeue_stale() == []
+    time.sleep(0.3)
+    queue.requeue_stale()
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["attempts"] == 2 and job["error"]["type"] == "WorkerLost"
+
+def test_queued_jobs_of_a_stopped_pool_fail(queue):
+    orphan, served = queue.submit("u1", owner="gone"), queue.submit("u2", owner="alive")
+    time.sleep(0.3)
+    queue.heartbeat("w", owner="alive")
+    queue.requeue_stale()
+    assert queue.get(orphan)["error"]["type"] == "OwnerLost"
+    assert queue.get(served)["status"] == "queued"
+    assert queue.in_flight([orphan, served]) == {served}
+
+def test_opens_queue_without_owner_column(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, url TEXT NOT NULL, options TEXT, status TEXT NOT NULL, "
+               "stage TEXT, progress TEXT, result TEXT, error TEXT, worker TEXT, attempts INTEGER DEFAULT 0, "
+               "created REAL, started REAL, finished REAL, heartbeat REAL)")
+    db.execute("CREATE TABLE workers (name TEXT PRIMARY KEY, seen REAL)")
+    db.commit()
+    db.close()
+    queue = jobs.JobQueue(path)
+    assert queue.get(queue.submit("u", owner="pool"))["owner"] == "pool"
@@ -0,0 +1,50 @@
+"""TokenBucketScheduler slots and budgets, and LLMBackend releasing them on every path (benchmarks.fakes)."""
+import asyncio
+
+import pytest
+
+import modules
+from benchmarks.fakes import FakeLLMBackend
+
+def test_in_flight_cap():
+    s = modules.TokenBucketScheduler(rpm=100, tpm=10000, max_in_flight=2)
+    s.acquire_sync(10)
+    asyncio.run(s.acquire(10))
+    assert s._in_flight == 2 and s._try_acquire(10) > 0
+    s.release(10)
+    assert s._try_acquire(10) == 0 and s._in_flight == 2
+
+def test_release_settles_tokens():
+    s = modules.TokenBucketScheduler(rpm=100, tpm=1000, max_in_flight=8)
+    s.acquire_sync(600)
+    assert s._try_acquire(600) > 0  # 400 tokens left
+    s.release(600, used=100)
+    assert s._in_flight == 0 and s._tokens == pytest.approx(900, abs=1)
+
+def test_pause_blocks_every_caller():
+    s = modules.TokenBucketScheduler(rpm=100, tpm=1000)
+    s.pause(5)
+    assert 4 < s._try_acquire(1) <= 5
+
+def test_scheduler_per_key_and_model():
+    a = modules.scheduler_for("m", "key-1")
+    assert a is modules.scheduler_for("m", "key-1")
+    assert a is not modules.scheduler_for("m", "key-2") and a is not modules.scheduler_for("other", "key-1")
+
+def failing(messages):
+    raise ValueError("bad request")  # not retryable
+
+@pytest.mark.parametrize("call", [lambda llm: llm.chat("hi"), lambda llm: list(llm.stream("hi")),
+                                  lambda llm: asyncio.run(llm.achat("hi"))])
+def test_errors_release_the_slot(call):
+    s = modules.TokenBucketScheduler(rpm=1000, tpm=10 ** 6, max_in_flight=1)
+    llm = FakeLLMBackend(reply=failing, scheduler=s)
+    with pytest.raises(ValueError):
+        call(llm)
+    assert s._in_flight == 0  # a leaked slot would block every later call forever
+
+def test_stream_releases_after_completion():
+    s = modules.TokenBucketScheduler(rpm=1000, tpm=10 ** 6, max_in_flight=1)
+    llm = FakeLLMBackend(scheduler=s)
+    assert "".join(llm.stream("Say something")).strip()
+    assert s._in_flight == 0
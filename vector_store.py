@@ -0,0 +1,276 @@
+"""On-disk multi-paper chunk vector store with an IVF (inverted file) approximate index.
+
+Vectors live in a growable float32 memmap; per-row metadata (paper, page,
+alive flag, IVF list) lives in NumPy arrays saved next to it, and chunk texts
+in an append-only JSONL file. Rows are L2-normalized, so scores are cosine
+similarities. Metadata arrays grow by doubling like the memmap, so adding a
+paper costs O(its rows). Call save() to persist metadata after writes (once per
+batch of papers: it rewrites all of it); one writer process per store directory.
+"""
+import json, os, threading
+import numpy as np
+
+COLUMNS = {"paper_codes": np.int32, "pages": np.int32, "alive": bool, "lists": np.int32, "text_offsets": np.int64}
+
+def _column(name):
+    """The first n rows of a metadata column's buffer; assigning replaces the buffer."""
+    def set_column(self, value):
+        self._columns[name] = np.asarray(value, COLUMNS[name])
+    return property(lambda self: self._columns[name][:self.n], set_column)
+
+class VectorStore:
+    TRAIN_MIN_ROWS = 20000  # below this, exact search is already sub-millisecond
+    paper_codes, pages, alive, lists, text_offsets = map(_column, COLUMNS)
+
+    def __init__(self, path, dim=384, nprobe=8):
+        self.path, self.dim, self.nprobe = path, dim, nprobe
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._members = None
+        self._columns = {name: np.zeros(0, dtype) for name, dtype in COLUMNS.items()}
+        meta = os.path.join(path, "meta.npz")
+        if os.path.exists(meta):
+            with np.load(meta) as m:
+                self.n = int(m["n"])
+                self.dim = int(m["dim"])
+                for name in COLUMNS:
+                    self._columns[name] = m[name].copy()
+                self.centroids = m["centroids"].copy() if m["centroids"].size else None
+                self.trained_at = int(m["trained_at"])
+            with open(os.path.join(path, "papers.json")) as f:
+                self.papers = json.load(f)
+        else:
+            self.n, self.trained_at, self.centroids = 0, 0, None
+            self.papers = []
+        self._paper_index = {p: i for i, p in enumerate(self.papers)}
+        self._live = int(self.alive.sum())
+        self._paper_rows = None  # paper code -> [(start, end)] row ranges, built on first delete
+        self._vectors = self._open_vectors(max(self.n, 1024))
+
+    # ---- storage ----
+    def _open_vectors(self, capacity):
+        fname = os.path.join(self.path, "vectors.f32")
+        size = capacity * self.dim * 4
+        if not os.path.exists(fname) or os.path.getsize(fname) < size:
+            with open(fname, "ab") as f:
+                f.truncate(size)
+        capacity = os.path.getsize(fname) // (self.dim * 4)
+        return np.memmap(fname, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    @property
+    def vectors(self):
+        return self._vectors[:self.n]
+
+    def __len__(self):
+        return self._live
+
+    def _reserve(self, rows):
+        """Grow the metadata buffers to hold at least rows rows, doubling their capacity."""
+        for name, col in self._columns.items():  # train() and compact() replace single columns
+            if rows > len(col):
+                grown = np.zeros(max(rows, 2 * len(col), 1024), col.dtype)
+                grown[:self.n] = col[:self.n]
+                self._columns[name] = grown
+
+    def _ranges(self):
+        if self._paper_rows is None:
+            codes = self.paper_codes
+            starts = np.flatnonzero(np.diff(codes, prepend=-1))  # papers are added as contiguous runs
+            ends = np.append(starts[1:], self.n)
+            self._paper_rows = {}
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                self._paper_rows.setdefault(int(codes[start]), []).append((start, end))
+        return self._paper_rows
+
+    def save(self):
+        with self._lock:
+            self._vectors.flush()
+            tmp = os.path.join(self.path, "meta.tmp.npz")
+            np.savez(tmp, n=self.n, dim=self.dim, paper_codes=self.paper_codes, pages=self.pages,
+                     alive=self.alive, lists=self.lists, text_offsets=self.text_offsets,
+                     centroids=self.centroids if self.centroids is not None else np.zeros(0, np.float32),
+                     trained_at=self.trained_at)
+            os.replace(tmp, os.path.join(self.path, "meta.npz"))
+            with open(os.path.join(self.path, "papers.json.tmp"), "w") as f:
+                json.dump(self.papers, f)
+            os.replace(os.path.join(self.path, "papers.json.tmp"), os.path.join(self.path, "papers.json"))
+
+    # ---- writes ----
+    def add(self, paper_id, vectors, pages, texts):
+        """Append one paper's chunk vectors; returns their row ids. Re-adding a paper replaces it."""
+        vecs = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        vecs = vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        self.delete(paper_id)
+        with self._lock:
+            code = self._paper_index.get(paper_id)
+            if code is None:
+                code = self._paper_index[paper_id] = len(self.papers)
+                self.papers.append(paper_id)
+            start, end = self.n, self.n + len(vecs)
+            if end > self._vectors.shape[0]:
+                self._vectors.flush()
+                self._vectors = self._open_vectors(max(end, 2 * self._vectors.shape[0]))
+            self._vectors[start:end] = vecs
+            with open(os.path.join(self.path, "texts.jsonl"), "ab") as f:
+                offsets = []
+                for t in texts:
+                    offsets.append(f.tell())
+                    f.write(json.dumps(t).encode() + b"\n")
+            self._reserve(end)
+            cols = self._columns
+            cols["paper_codes"][start:end] = code
+            cols["pages"][start:end] = pages
+            cols["alive"][start:end] = True
+            cols["text_offsets"][start:end] = offsets
+            cols["lists"][start:end] = self._assign(vecs)
+            self.n = end
+            self._live += len(vecs)
+            if self._paper_rows is not None:
+                self._paper_rows.setdefault(code, []).append((start, end))
+            self._members = None
+        if len(self) >= self.TRAIN_MIN_ROWS and len(self) >= 2 * self.trained_at:
+            self.train()
+        return np.arange(start, end)
+
+    def delete(self, paper_id=None, ids=None):
+        """Tombstone rows of a paper and/or explicit row ids; returns how many were removed."""
+        with self._lock:
+            alive, removed = self.alive, 0
+            if paper_id is not None and paper_id in self._paper_index:
+                for start, end in self._ranges().pop(self._paper_index[paper_id], []):
+                    removed += int(alive[start:end].sum())
+                    alive[start:end] = False
+            if ids is not None:
+                ids = np.unique(np.asarray(ids, np.int64))
+                ids = ids[alive[ids]]
+                alive[ids] = False
+                removed += len(ids)
+            self._live -= removed
+            return removed
+
+    # ---- IVF index ----
+    def _assign(self, vecs, block=65536):
+        if self.centroids is None:
+            return np.zeros(len(vecs), np.int32)
+        out = np.empty(len(vecs), np.int32)
+        for i in range(0, len(vecs), block):
+            out[i:i + block] = np.argmax(vecs[i:i + block] @ self.centroids.T, axis=1)
+        return out
+
+    def train(self, nlist=None, iters=10, sample=None, seed=0):
+        """Spherical k-means on a sample of live rows, then reassign every row to its nearest list."""
+        rng = np.random.default_rng(seed)
+        live = np.flatnonzero(self.alive)
+        nlist = min(nlist or max(1, int(4 * np.sqrt(len(live)))), len(live))
+        pick = np.sort(rng.choice(live, min(len(live), sample or 40 * nlist), replace=False))
+        data = np.asarray(self.vectors[pick])
+        cent = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(data @ cent.T, axis=1)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=nlist)
+            sums = np.zeros_like(cent)
+            used = counts > 0
+            sums[used] = np.add.reduceat(data[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[used])
+            sums[~used] = data[rng.choice(len(data), int((~used).sum()))]  # reseed empty lists
+            cent = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self.centroids = cent.astype(np.float32)
+            self.lists = self._assign(self.vectors)
+            self.trained_at = len(live)
+            self._members = None
+
+    def _list_members(self):
+        if self._members is None:
+            order = np.argsort(self.lists, kind="stable")
+            bounds = np.searchsorted(self.lists[order], np.arange(len(self.centroids) + 1))
+            self._members = (order, bounds)
+        return self._members
+
+    # ---- queries ----
+    def _filter(self, papers=None, pages=None):
+        mask = self.alive.copy()
+        if papers is not None:
+            codes = [self._paper_index[p] for p in papers if p in self._paper_index]
+            mask &= np.isin(self.paper_codes, codes)
+        if pages is not None:
+            lo, hi = pages
+            mask &= (self.pages >= lo) & (self.pages <= hi)
+        return mask
+
+    def _candidates(self, q, nprobe, mask):
+        order, bounds = self._list_members()
+        probe = np.argpartition(-(self.centroids @ q), min(nprobe, len(self.centroids)) - 1)[:nprobe]
+        cand = np.concatenate([order[bounds[l]:bounds[l + 1]] for l in probe])
+        return np.sort(cand[mask[cand]])
+
+    def search_ids(self, query, k=10, papers=None, pages=None, nprobe=None, exact=False):
+        """Return (row_ids, scores) of the k best live rows matching the paper/page filters."""
+        q = np.asarray(query, np.float32).ravel()
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        filtered = papers is not None or pages is not None
+        mask = self._filter(papers, pages) if filtered else self.alive
+        nprobe = nprobe or self.nprobe
+        if (exact or self.centroids is None) and not filtered:
+            # unfiltered scan: one contiguous mat-vec beats gathering rows
+            scores = np.where(mask, self.vectors @ q, -np.inf)
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return np.zeros(0, np.int64), np.zeros(0, np.float32)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return top, scores[top].astype(np.float32)
+        if exact or self.centroids is None:
+            cand = np.flatnonzero(mask)
+        else:
+            cand = self._candidates(q, nprobe, mask)
+            # a narrow filter (e.g. one paper) is cheaper and exact to scan directly
+            if filtered and mask.sum() <= len(cand):
+                cand = np.flatnonzero(mask)
+        if len(cand) == 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+        scores = self._vectors[cand] @ q
+        k = min(k, len(cand))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return cand[top], scores[top]
+
+    def text(self, row):
+        with open(os.path.join(self.path, "texts.jsonl"), "rb") as f:
+            f.seek(int(self.text_offsets[row]))
+            return json.loads(f.readline())
+
+    def search(self, query, k=10, papers=None, pages=None, nprobe=None, exact=False):
+        ids, scores = self.search_ids(query, k, papers, pages, nprobe, exact)
+        return [{"id": int(i), "paper_id": self.papers[self.paper_codes[i]], "page": int(self.pages[i]),
+                 "text": self.text(i), "score": float(s)} for i, s in zip(ids, scores)]
+
+    def recall_at_k(self, queries, k=10, nprobe=None):
+        """Mean fraction of the exact top-k that the IVF search returns."""
+        hits = 0
+        for q in queries:
+            approx, _ = self.search_ids(q, k, nprobe=nprobe)
+            exact, _ = self.search_ids(q, k, exact=True)
+            hits += len(np.intersect1d(approx, exact))
+        return hits / (k * len(queries)) if len(queries) else 0.0
+
+    def compact(self):
+        """Drop tombstoned rows, rewriting vectors, metadata and texts."""
+        keep = np.flatnonzero(self.alive)
+        texts = [self.text(i) for i in keep]
+        with self._lock:
+            vecs = np.asarray(self._vectors[keep])
+            self._vectors[:len(keep)] = vecs
+            with open(os.path.join(self.path, "texts.jsonl.tmp"), "wb") as f:
+                offsets = []
+                for t in texts:
+                    offsets.append(f.tell())
+                    f.write(json.dumps(t).encode() + b"\n")
+            os.replace(os.path.join(self.path, "texts.jsonl.tmp"), os.path.join(self.path, "texts.jsonl"))
+            self.paper_codes, self.pages = self.paper_codes[keep], self.pages[keep]
+            self.lists, self.alive = self.lists[keep], self.alive[keep]
+            self.text_offsets = np.asarray(offsets, np.int64)
+            self.n = self._live = len(keep)
+            self._paper_rows = None
+            self._members = None
+        self.save()